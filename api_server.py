@@ -3,21 +3,44 @@ DRISHTI-SHIELD API Server V2
 Professional GEOINT Analysis Platform
 """
 
+import asyncio
+import json
 import os
 import shutil
+import time
 import cv2
 import uvicorn
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, Header, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Any, Dict, List, Optional, Tuple
 
 # Import our pipeline modules
+from src import config
+from src.api.results import router as results_router
+from src.api.uploads import read_upload
+from src.pipeline import object_detection
+from src.pipeline.aoi_batch import (bounds_to_window, group_by_scene, slice_detections,
+                                    slice_regions, union_bounds, window_ssim)
 from src.pipeline.report_generator import generate_intelligence_summary
-from src.utils.geo_utils import convert_pixels_to_geojson
+from src.pipeline.risk_scoring import (RiskWeights, compute_risk_score, detection_table,
+                                       fuse_detections, rescore_columns, table_to_records)
+from src.utils.analysis_cache import default_cache as analysis_cache, snap_bounds
+from src.utils.anomaly_store import get_store as get_anomaly_store, to_geojson as anomalies_to_geojson
+from src.utils.footprints import default_footprints as footprints
+from src.utils.geo_utils import bounds_transform, convert_pixels_to_geojson, pixels_to_geo
 from src.pipeline.change_detection import advanced_change_detection
+from src.pipeline.preprocessing import load_scenes
+from src.pipeline.timeseries import AoiBaseline
+from src.utils.jobs import SUCCEEDED, JobCancelled, JobQueue, QueueFull, StageChannel
+from src.utils import metrics
+from src.utils.mask_tiles import MAX_ZOOM, default_tiles as mask_tiles
+from src.utils.result_store import default_store as result_store
 
 # Define request/response models
 class AoiBounds(BaseModel):
@@ -27,6 +50,22 @@ class AoiBounds(BaseModel):
 class AnalysisRequest(BaseModel):
     aoi_bounds: AoiBounds
 
+class BatchAnalysisRequest(BaseModel):
+    aoi_bounds: List[AoiBounds]
+
+class RescoreRequest(BaseModel):
+    # Unset weights keep their configured values
+    class_weights: Optional[Dict[str, float]] = None
+    default_class_weight: Optional[float] = None
+    confidence_weight: Optional[float] = None
+    change_weight: Optional[float] = None
+    ssim_weight: Optional[float] = None
+    max_score: Optional[float] = None
+    since: Optional[float] = None
+    until: Optional[float] = None
+    persist: bool = False
+    top: int = 100
+
 # Create FastAPI App
 app = FastAPI(title="DRISHTI-SHIELD API", version="2.0.0")
 
@@ -39,128 +78,621 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency by route and a Server-Timing header of pipeline stages
+app.middleware("http")(metrics.server_timing_middleware)
+
+# Pipeline work runs here, off the event loop
+job_queue = JobQueue(workers=config.JOB_WORKERS, max_queue=config.JOB_QUEUE_MAX,
+                     result_ttl_s=config.JOB_RESULT_TTL_S)
+
 # Static File Server
 os.makedirs("static", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Stored masks and reports by digest (GET /api/v1/results/{digest})
+app.include_router(results_router)
+
 
 @app.get("/")
 def root():
     return {"message": "DRISHTI-SHIELD API is running!", "version": "2.0.0"}
 
 
+@app.get("/ready")
+def readiness():
+    """
+    Readiness probe. The AOI pipeline uses simulated detections and never
+    runs the ViT, so the model is neither warmed up nor waited for here;
+    its status is reported for information only.
+    """
+    return {"ready": True, "job_queue": job_queue.stats(), "detector": object_detection.model_status()}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Per-stage latency and memory histograms in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _url(path: str) -> str:
+    """Absolute URL of an API path, for the frontend (which may be served elsewhere)."""
+    return f"{config.API_BASE_URL}{path}"
+
+
+def _analysis_urls(analysis_id: str) -> dict:
+    """Tile and footprint URLs of a registered change mask."""
+    return {"analysis_id": analysis_id,
+            "change_mask_tiles_url": _url(f"/tiles/{analysis_id}/{{z}}/{{x}}/{{y}}.png"),
+            "change_footprint_url": _url(f"/api/v1/analyses/{analysis_id}/footprint")}
+
+
+def _mask_png_url(change_mask: np.ndarray) -> Optional[str]:
+    """
+    Result-store URL of a change mask as one PNG, or None when the mask
+    is too large for the tile pyramid budget at full resolution: such
+    masks are only served as tiles instead of as a scene-sized PNG.
+    """
+    if not mask_tiles.fits(change_mask.shape):
+        return None
+    _, mask_png = cv2.imencode(".png", change_mask)
+    return _url(f"/api/v1/results/{result_store.put(mask_png.tobytes(), 'image/png')}")
+
+
+def _scene_for(aoi_bounds: dict) -> Tuple[str, str]:
+    """
+    Returns the (before, after) image paths covering an AOI. AOIs that
+    map to the same pair share one scene in batch analyses.
+    """
+    # --- SIMULATE IMAGE FETCHING ---
+    # In a real system, you'd use these bounds to query a service
+    # (like Sentinel Hub or Google Earth Engine) to get "before"
+    # and "after" GeoTIFF images for this *exact* AOI.
+
+    # For our demo, we'll just use our dummy files.
+    # These are now *assumed* to be the images for the requested AOI.
+    before_path = "data/dummy_before.png"
+    after_path = "data/dummy_after.png"
+
+    if not os.path.exists(before_path) or not os.path.exists(after_path):
+        raise FileNotFoundError("Demo images not found.")
+    return before_path, after_path
+
+
+def _mock_detections() -> list:
+    # In a real system, you'd run your ViT model here on img_after
+    # For now, we'll mock the *output* of the ViT model
+    return [
+        {"bbox_pixels": [100, 100, 150, 150], "class": "Vehicle", "confidence": 0.95},
+        {"bbox_pixels": [300, 300, 400, 400], "class": "New Structure", "confidence": 0.88},
+        {"bbox_pixels": [50, 400, 80, 430], "class": "Vehicle", "confidence": 0.91},
+    ]
+
+
+def _record_anomalies(fused_data: list, aoi_bounds: dict, image_dims: tuple,
+                      risk_score: float, ssim_score: float, analysis_id: str):
+    """
+    Stores fused anomalies with their geo bboxes for later bbox/time
+    queries. The analysis is recorded even without anomalies, so
+    re-scoring still covers it.
+    """
+    anomalies = []
+    if fused_data:
+        bboxes = np.asarray([det["bbox_pixels"] for det in fused_data], dtype=np.float64)
+        transform = bounds_transform(aoi_bounds, image_dims)
+        corner_a = pixels_to_geo(transform, bboxes[:, 0], bboxes[:, 1])
+        corner_b = pixels_to_geo(transform, bboxes[:, 2], bboxes[:, 3])
+        geo = np.concatenate([np.minimum(corner_a, corner_b), np.maximum(corner_a, corner_b)], axis=1)
+        anomalies = [{**det, "bbox": box} for det, box in zip(fused_data, geo.tolist())]
+    try:
+        get_anomaly_store().add(anomalies, analysis_id=analysis_id, risk_score=risk_score,
+                                ssim_score=ssim_score)
+    except Exception as e:
+        # Recording is best effort; the analysis itself has succeeded
+        print(f"[API Error] Could not record anomalies: {e}")
+
+
+def _fuse_and_report(aoi_bounds: dict, change_mask: np.ndarray, ssim_score: float,
+                     change_regions: np.ndarray, detections: list, change_mask_url: Optional[str],
+                     emit=None) -> dict:
+    """
+    Fusion, risk scoring, GeoJSON and report for one AOI whose change
+    mask, regions and detections are all in the AOI's pixel frame.
+    """
+    # --- 3. Run Fusion & Risk Scoring ---
+    print("[API] Fusing data and scoring risk...")
+    # Changed fraction of every detection box from one summed-area table
+    with metrics.span("fusion"):
+        table = fuse_detections(detection_table(detections), change_mask)
+        # Existing objects are left out of the fused output
+        fused_data = table_to_records(table[table["is_new"]])
+        risk_score = compute_risk_score(table, ssim_score)
+
+    # --- 4. Convert Pixels to GeoJSON ---
+    print("[API] Converting pixel coordinates to GeoJSON...")
+    # This is now a critical function.
+    anomalies_geojson = convert_pixels_to_geojson(
+        fused_data, 
+        aoi_bounds, 
+        change_mask.shape[:2]
+    )
+    if emit:
+        emit("anomalies", {"risk_score": risk_score, "fused_data": fused_data,
+                           "anomalies_geojson": anomalies_geojson})
+
+    # --- 5. Generate LLM Report ---
+    print("[API] Generating final report...")
+    # Create a richer context object for the LLM
+    report_context = {
+        "aoi_coordinates": aoi_bounds,
+        "detected_anomalies": fused_data,
+        "overall_ssim_score": ssim_score,
+        "change_region_count": int(len(change_regions)),
+        "changed_area_pixels": int(change_regions["area"].sum()),
+        "risk_score": risk_score
+    }
+    report_text = generate_intelligence_summary(report_context, risk_score)
+    if emit:
+        emit("report", {"report_summary": report_text})
+
+    # --- 6. Send Response to Frontend ---
+    return {
+        "report_summary": report_text,
+        "change_mask_url": change_mask_url,
+        "anomalies_geojson": anomalies_geojson,
+        "image_bounds": aoi_bounds,
+        "risk_score": risk_score,
+        "fused_data": fused_data
+    }
+
+
+def run_aoi_analysis(aoi_bounds: AoiBounds, emit=None) -> dict:
+    """
+    Runs the full AOI pipeline: simulates image fetching, runs change
+    detection and fusion, and returns GeoJSON plus the report. CPU-bound,
+    so it runs on the job pool, never on the event loop.
+
+    emit(stage, payload), when given, receives each stage's output as soon
+    as it is ready ("change_detection", "anomalies", "report").
+    """
+    print(f"[API] Received analysis request for AOI: {aoi_bounds}")
+
+    # --- 1. Fetch the scene ---
+    # Decoded once; every stage works on the scenes' shared views
+    before, after = load_scenes(*_scene_for(aoi_bounds.dict()))
+
+    # --- 2. Run Upgraded ML Pipeline ---
+    print("[API] Running advanced change detection...")
+    # This new function is much smarter than cv2.absdiff
+    change_mask, ssim_score, change_regions = advanced_change_detection(
+        before, after, return_regions=True)
+    
+    # Keep the mask in the result store under a per-request URL instead of
+    # a file the next run rewrites; cache hits re-check it is still held
+    change_mask_url = _mask_png_url(change_mask)
+    # Map tiles of the mask, rendered on demand for the visible area only
+    analysis_id = mask_tiles.register(change_mask, aoi_bounds.dict())
+    tiles = _analysis_urls(analysis_id)
+    if emit:
+        emit("change_detection", {"ssim_score": ssim_score, "change_mask_url": change_mask_url,
+                                  "change_region_count": int(len(change_regions)),
+                                  "image_bounds": aoi_bounds.dict(), **tiles})
+    
+    print("[API] Running object detection (Simulated)...")
+    result = _fuse_and_report(aoi_bounds.dict(), change_mask, ssim_score, change_regions,
+                              _mock_detections(), change_mask_url, emit=emit)
+    result.update(tiles)
+    _record_anomalies(result["fused_data"], aoi_bounds.dict(), change_mask.shape[:2],
+                      result["risk_score"], ssim_score, analysis_id)
+    print("[API] Analysis complete. Sending response.")
+    return result
+
+
+def run_aoi_batch(aoi_bounds_list: List[AoiBounds], emit) -> dict:
+    """
+    Analyzes many AOIs, doing scene work once per scene instead of once
+    per AOI. AOIs are grouped by _scene_for; each group's union bounds
+    are mapped onto its scene, change detection runs once, and every AOI
+    is fused, scored and reported on its own slice of the shared mask and
+    SSIM diff (so its SSIM is that of its own pixels, not the scene's).
+
+    emit("aoi", payload) is called as each AOI finishes; a failing AOI
+    (or scene) is reported as an "error" entry and does not stop the rest.
+    """
+    bounds = [b.dict() for b in aoi_bounds_list]
+    print(f"[API] Received batch analysis request for {len(bounds)} AOIs")
+    scene_count = failed = 0
+
+    def scene_key(aoi: dict):
+        try:
+            return _scene_for(aoi)
+        except FileNotFoundError as e:
+            return ("error", str(e))
+
+    for scene, indices in group_by_scene(bounds, scene_key).items():
+        if scene[0] == "error":
+            for index in indices:
+                failed += 1
+                emit("aoi", {"index": index, "status": "error", "detail": scene[1]})
+            continue
+
+        scene_count += 1
+        scene_bounds = union_bounds([bounds[i] for i in indices])
+        print(f"[API] Running change detection once for {len(indices)} AOIs on {scene[1]}")
+        change_mask, scene_ssim, change_regions, ssim_diff = advanced_change_detection(
+            *load_scenes(*scene), return_regions=True, return_diff=True)
+        detections = _mock_detections()
+
+        for index in indices:
+            try:
+                window = bounds_to_window(bounds[index], scene_bounds, change_mask.shape[:2])
+                row0, col0, row1, col1 = window
+                aoi_mask = change_mask[row0:row1, col0:col1]
+                ssim_score = window_ssim(ssim_diff, window, default=scene_ssim)
+                result = _fuse_and_report(bounds[index], aoi_mask, ssim_score,
+                                          slice_regions(change_regions, window),
+                                          slice_detections(detections, window), _mask_png_url(aoi_mask))
+                analysis_id = mask_tiles.register(aoi_mask, bounds[index])
+                result.update(_analysis_urls(analysis_id))
+                _record_anomalies(result["fused_data"], bounds[index], aoi_mask.shape[:2],
+                                  result["risk_score"], ssim_score, analysis_id)
+                emit("aoi", {"index": index, "status": "ok", "result": result})
+            except JobCancelled:
+                raise
+            except Exception as e:
+                print(f"[API Error] AOI {index}: {e}")
+                failed += 1
+                emit("aoi", {"index": index, "status": "error", "detail": str(e)})
+
+    return {"aoi_count": len(bounds), "scene_count": scene_count, "failed": failed}
+
+
+def _submit_job(kind: str, fn, *args, **kwargs):
+    """Queues pipeline work on the job pool; 429 when the queue is saturated."""
+    try:
+        return job_queue.submit(kind, fn, *args, **kwargs)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(config.JOB_RETRY_AFTER_S)})
+
+
+def _cache_key(aoi_bounds: AoiBounds) -> Tuple[AoiBounds, str]:
+    """
+    Snaps the AOI to the cache grid and returns (snapped bounds, ETag).
+    The snapped bounds are what gets analyzed, so a cached result is exact
+    for every AOI that snaps to the same cell.
+    """
+    snapped = snap_bounds(aoi_bounds.dict(), analysis_cache.grid_deg)
+    try:
+        imagery = _scene_for(snapped)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    status = object_detection.model_status()
+    model = {k: status[k] for k in ("model", "backend", "quantized")}
+    return AoiBounds(**snapped), analysis_cache.etag(snapped, imagery, model)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/").strip('"') for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def run_cached_aoi_analysis(aoi_bounds: AoiBounds, etag: str, emit=None) -> dict:
+    """run_aoi_analysis that records its stages and caches them with the result."""
+    stages = []
+
+    def record(stage: str, payload: dict):
+        stages.append((stage, payload))
+        if emit:
+            emit(stage, payload)
+
+    result = run_aoi_analysis(aoi_bounds, emit=record)
+    mask_url = result["change_mask_url"]
+    analysis_cache.put(etag, {"result": result, "stages": stages,
+                              "mask_digest": mask_url.rsplit("/", 1)[-1] if mask_url else None})
+    return result
+
+
+def _cached_analysis(etag: str) -> Optional[dict]:
+    """
+    The cached analysis for an ETag, or None if there is none or its URLs
+    would no longer resolve: the result store and tile server evict on
+    their own budgets, so such an entry is re-run instead of served.
+    Looking them up also refreshes them in both LRUs.
+    """
+    cached = analysis_cache.get(etag)
+    if cached is None:
+        return None
+    # Masks over the tile budget have tiles only (no PNG digest) to check
+    if ((cached["mask_digest"] is not None and result_store.get(cached["mask_digest"]) is None)
+            or mask_tiles.mask(cached["result"]["analysis_id"]) is None):
+        return None
+    return cached
+
+
 @app.post("/api/v1/analyze_aoi")
-async def analyze_area_of_interest(request: AnalysisRequest):
+async def analyze_area_of_interest(request: AnalysisRequest,
+                                   if_none_match: Optional[str] = Header(None)):
     """
     The main V2 analysis endpoint. Receives Lat/Lng bounds,
     simulates image fetching, runs the pipeline, and returns GeoJSON.
+
+    The pipeline runs on the job pool; this request just awaits it.
+    Results are cached per snapped AOI and imagery/model version and
+    carry an ETag; a matching If-None-Match gets a 304.
     """
+    aoi_bounds, etag = _cache_key(request.aoi_bounds)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+    cached = _cached_analysis(etag)
+    if cached is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=jsonable_encoder(cached["result"]),
+                            headers={**headers, "X-Cache": "HIT"})
+
+    job = _submit_job("analyze_aoi", run_cached_aoi_analysis, aoi_bounds, etag)
     try:
-        aoi_bounds = request.aoi_bounds
-        print(f"[API] Received analysis request for AOI: {aoi_bounds}")
-
-        # --- 1. SIMULATE IMAGE FETCHING ---
-        # In a real system, you'd use these bounds to query a service
-        # (like Sentinel Hub or Google Earth Engine) to get "before"
-        # and "after" GeoTIFF images for this *exact* AOI.
-        
-        # For our demo, we'll just use our dummy files.
-        # These are now *assumed* to be the images for the requested AOI.
-        before_path = "data/dummy_before.png"
-        after_path = "data/dummy_after.png"
-        
-        if not os.path.exists(before_path) or not os.path.exists(after_path):
-            raise HTTPException(status_code=500, detail="Demo images not found.")
-
-        img_before = cv2.imread(before_path)
-        img_after = cv2.imread(after_path)
-        
-        # Get image dimensions (H, W, C)
-        image_height, image_width, _ = img_before.shape
-        image_dims = (image_height, image_width)
-
-        # --- 2. Run Upgraded ML Pipeline ---
-        print("[API] Running advanced change detection...")
-        # This new function is much smarter than cv2.absdiff
-        change_mask, ssim_score = advanced_change_detection(before_path, after_path)
-        
-        # Save the mask so the frontend can fetch it
-        mask_filename = "change_mask_latest.png"
-        mask_save_path = f"static/{mask_filename}"
-        cv2.imwrite(mask_save_path, change_mask)
-        
-        # URL for the frontend to access
-        change_mask_url = f"http://127.0.0.1:8000/static/{mask_filename}"
-        
-        print("[API] Running object detection (Simulated)...")
-        # In a real system, you'd run your ViT model here on img_after
-        # For now, we'll mock the *output* of the ViT model
-        mock_detections = [
-            {"bbox_pixels": [100, 100, 150, 150], "class": "Vehicle", "confidence": 0.95},
-            {"bbox_pixels": [300, 300, 400, 400], "class": "New Structure", "confidence": 0.88},
-            {"bbox_pixels": [50, 400, 80, 430], "class": "Vehicle", "confidence": 0.91},
-        ]
-
-        # --- 3. Run Fusion & Risk Scoring ---
-        print("[API] Fusing data and scoring risk...")
-        # We'll fuse our mock ViT detections with our *real* change mask
-        fused_data = []
-        for det in mock_detections:
-            x1, y1, x2, y2 = det["bbox_pixels"]
-            # Check the *center* of the detected object
-            cx, cy = int((x1+x2)/2), int((y1+y2)/2)
-            
-            # Check if this pixel is "changed" in our mask
-            if change_mask[cy, cx] == 255:
-                det["type"] = "New Anomaly"
-                fused_data.append(det)
+        result = await job.wait()
+    except Exception as e:
+        print(f"[API Error] {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(content=jsonable_encoder(result), headers={**headers, "X-Cache": "MISS"})
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@app.post("/api/v1/analyze_aoi/stream")
+async def stream_area_of_interest(request: AnalysisRequest):
+    """
+    Streaming variant of analyze_aoi. Sends Server-Sent Events as each
+    stage finishes: "job", "change_detection", "anomalies", "report", then
+    "complete" (or "error"). Closing the connection cancels the stages
+    that have not run yet. A cached analysis is replayed at once, with
+    "job_id": null.
+    """
+    aoi_bounds, etag = _cache_key(request.aoi_bounds)
+    cached = _cached_analysis(etag)
+    if cached is not None:
+        async def replay():
+            yield _sse("job", {"job_id": None, "cached": True})
+            for stage, payload in cached["stages"]:
+                yield _sse(stage, payload)
+            yield _sse("complete", {"job_id": None, "status": SUCCEEDED})
+
+        return StreamingResponse(replay(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "ETag": f'"{etag}"'})
+
+    channel = StageChannel(asyncio.get_running_loop())
+    job = _submit_job("analyze_aoi", run_cached_aoi_analysis, aoi_bounds, etag, emit=channel.emit)
+    channel.attach(job)
+
+    async def events():
+        try:
+            yield _sse("job", {"job_id": job.id})
+            async for stage, payload in channel.stages():
+                yield _sse(stage, payload)
+            if job.status == SUCCEEDED:
+                yield _sse("complete", {"job_id": job.id, "status": job.status})
             else:
-                det["type"] = "Existing Object"
-                # You could choose to ignore existing objects
-                # fused_data.append(det) 
-
-        # Calculate a simple risk score
-        risk_score = (len(fused_data) * 3.0) + (1 - ssim_score) * 10.0
-        risk_score = min(max(risk_score, 0), 10)  # Clamp between 0-10
-
-        # --- 4. Convert Pixels to GeoJSON ---
-        print("[API] Converting pixel coordinates to GeoJSON...")
-        # This is now a critical function.
-        anomalies_geojson = convert_pixels_to_geojson(
-            fused_data, 
-            aoi_bounds.dict(), 
-            image_dims
-        )
-
-        # --- 5. Generate LLM Report ---
-        print("[API] Generating final report...")
-        # Create a richer context object for the LLM
-        report_context = {
-            "aoi_coordinates": aoi_bounds.dict(),
-            "detected_anomalies": fused_data,
-            "overall_ssim_score": ssim_score,
-            "risk_score": risk_score
-        }
-        report_text = generate_intelligence_summary(report_context, risk_score)
-
-        # --- 6. Send Response to Frontend ---
-        print("[API] Analysis complete. Sending response.")
-        return {
-            "report_summary": report_text,
-            "change_mask_url": change_mask_url,
-            "anomalies_geojson": anomalies_geojson,
-            "image_bounds": aoi_bounds.dict(),
-            "risk_score": risk_score,
-            "fused_data": fused_data
-        }
+                yield _sse("error", {"job_id": job.id, "status": job.status, "detail": job.error})
+        finally:
+            if not job.done:
+                job.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/api/v1/analyze_aoi/batch")
+async def analyze_aoi_batch(request: BatchAnalysisRequest):
+    """
+    Batch variant of analyze_aoi for tasking lists. AOIs in the same scene
+    share one change-detection run. Streams NDJSON: one {"type": "aoi"}
+    line per AOI as it finishes (in scene order, carrying its request
+    index), then a {"type": "complete"} or {"type": "error"} summary.
+    Closing the connection cancels the AOIs that have not run yet.
+    """
+    if not request.aoi_bounds:
+        raise HTTPException(status_code=400, detail="aoi_bounds is empty.")
+    if len(request.aoi_bounds) > config.AOI_BATCH_MAX:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {config.AOI_BATCH_MAX} AOIs per batch.")
+
+    channel = StageChannel(asyncio.get_running_loop())
+    job = _submit_job("analyze_aoi_batch", run_aoi_batch, request.aoi_bounds, channel.emit)
+    channel.attach(job)
+
+    def line(data: dict) -> str:
+        return json.dumps(jsonable_encoder(data)) + "\n"
+
+    async def results():
+        try:
+            async for stage, payload in channel.stages():
+                yield line({"type": stage, **payload})
+            if job.status == SUCCEEDED:
+                yield line({"type": "complete", "job_id": job.id, **job.result})
+            else:
+                yield line({"type": "error", "job_id": job.id, "status": job.status, "detail": job.error})
+        finally:
+            if not job.done:
+                job.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/tiles/{analysis_id}/{z}/{x}/{y}.png")
+def change_mask_tile(analysis_id: str, z: int, x: int, y: int):
+    """
+    One 256 px XYZ tile of an analysis' change mask: changed pixels in
+    red, the rest transparent. Rendered on demand from the mask pyramid.
+    """
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates.")
+    png = mask_tiles.tile(analysis_id, z, x, y)
+    if png is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis.")
+    # A tile of a given analysis never changes
+    return Response(content=png, media_type="image/png",
+                    headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 
+@app.get("/api/v1/analyses/{analysis_id}/footprint")
+def change_footprint(analysis_id: str, lod: str = "medium"):
+    """
+    Change footprint of an analysis as GeoJSON polygons, simplified for
+    the requested level of detail ("full", "high", "medium", "low").
+    Each LOD is polygonized and simplified once, then served from cache.
+    """
+    if lod not in config.FOOTPRINT_LODS:
+        raise HTTPException(status_code=400,
+                            detail=f"lod must be one of {', '.join(config.FOOTPRINT_LODS)}.")
+    geojson = footprints.get(analysis_id, lod)
+    if geojson is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis.")
+    return JSONResponse(content=geojson,
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.get("/api/v1/anomalies")
+def query_anomalies(bbox: str, since: float = None, until: float = None,
+                    anomaly_class: Optional[List[str]] = Query(None, alias="class"),
+                    limit: int = 1000):
+    """
+    Recorded anomalies intersecting bbox ("min_lng,min_lat,max_lng,max_lat"),
+    optionally observed within [since, until] (Unix seconds) and of the
+    given classes, newest first, as GeoJSON.
+    """
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat.")
+    if min_lng > max_lng or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox minimums exceed maximums.")
+    records = get_anomaly_store().query(min_lng, min_lat, max_lng, max_lat, since=since,
+                                        until=until, classes=anomaly_class,
+                                        limit=min(max(limit, 1), 10000))
+    return anomalies_to_geojson(records)
+
+
+@app.post("/api/v1/anomalies/rescore")
+def rescore_anomalies(request: RescoreRequest):
+    """
+    Re-scores the recorded anomaly history (optionally within [since,
+    until]) with new risk weights, per analysis, from columnar arrays
+    instead of replaying analyses. Analyses without anomalies are scored
+    from their SSIM alone. With persist, the new scores are written back
+    to the store. Returns the `top` highest-risk analyses.
+    """
+    weights = RiskWeights.from_config(**request.dict(include={
+        "class_weights", "default_class_weight", "confidence_weight",
+        "change_weight", "ssim_weight", "max_score"}))
+    store = get_anomaly_store()
+    start = time.perf_counter()
+    columns = store.scoring_columns(since=request.since, until=request.until)
+    analyses = store.analysis_columns(since=request.since, until=request.until)
+    analysis_ids, risk_scores = rescore_columns(columns, weights, analyses)
+    updated = store.set_risk_scores(analysis_ids, risk_scores) if request.persist else 0
+    order = np.argsort(-risk_scores, kind="stable")[:max(request.top, 0)]
+    return {
+        "analyses": int(len(analysis_ids)),
+        "anomalies": int(len(columns["class"])),
+        "updated_anomalies": int(updated),
+        "seconds": round(time.perf_counter() - start, 3),
+        "weights": weights._asdict(),
+        "top": [{"analysis_id": str(analysis_ids[i]), "risk_score": float(risk_scores[i])} for i in order],
+    }
+
+
+@app.post("/api/v1/jobs/analyze_aoi", status_code=202)
+def submit_analysis_job(request: AnalysisRequest):
+    """Queues an AOI analysis and returns its job ID without waiting."""
+    job = _submit_job("analyze_aoi", run_aoi_analysis, request.aoi_bounds)
+    return {**job.to_dict(), "status_url": f"/api/v1/jobs/{job.id}"}
+
+
+@app.get("/api/v1/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status of a job; includes the result once it has succeeded."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return job.to_dict()
+
+
+@app.get("/api/v1/jobs")
+def job_queue_status():
+    """Worker pool and queue occupancy."""
+    return job_queue.stats()
+
+
+class UndecodableImage(ValueError):
+    """Raised when an uploaded acquisition is not a readable image."""
+
+
+def run_timeseries_ingest(baseline: AoiBaseline, data: bytes, acquired_at: Optional[float]) -> dict:
+    """
+    Decodes an acquisition, updates the AOI's baseline with it and keeps
+    the change mask in the result store. CPU-bound; runs on the job pool.
+    """
+    with metrics.span("decode"):
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE) if data else None
+    if gray is None:
+        raise UndecodableImage("Could not decode image.")
+
+    change_mask, regions, meta = baseline.update(gray, acquired_at)
+    _, mask_png = cv2.imencode(".png", change_mask)
+    return {
+        "aoi_id": baseline.aoi_id,
+        "observations": meta["count"],
+        "changed_fraction": meta["last_changed_fraction"],
+        "change_region_count": int(len(regions)),
+        "change_mask_url": _url(f"/api/v1/results/{result_store.put(mask_png.tobytes(), 'image/png')}"),
+    }
+
+
+@app.post("/api/v1/timeseries/{aoi_id}/acquisitions")
+async def ingest_acquisition(aoi_id: str, image: UploadFile = File(...),
+                             acquired_at: float = Form(None)):
+    """
+    Adds a new acquisition of a monitored AOI. The image is compared with
+    the AOI's running per-pixel baseline (no history is re-read) and then
+    folded into it. Decoding and the update run on the job pool; the mask
+    is served from the result store, so concurrent ingests stay isolated.
+    Images over UPLOAD_MAX_MB are rejected with 413.
+    """
+    try:
+        baseline = AoiBaseline(aoi_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Size-capped read (413 over UPLOAD_MAX_MB); decoding happens on the job pool
+    data = await read_upload(image)
+    job = _submit_job("timeseries_ingest", run_timeseries_ingest, baseline, data, acquired_at)
+    try:
+        return await job.wait()
+    except UndecodableImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"[API Error] {e}")
-        import traceback
-        traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/timeseries/{aoi_id}")
+def timeseries_status(aoi_id: str):
+    """Baseline metadata for a monitored AOI."""
+    try:
+        baseline = AoiBaseline(aoi_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not baseline.exists():
+        raise HTTPException(status_code=404, detail="Unknown AOI.")
+    return baseline.metadata()
+
+
 if __name__ == "__main__":
     print("--- Starting DRISHTI-SHIELD API v2 on http://127.0.0.1:8000 ---")
     # Ensure you have 'data/dummy_before.png' and 'data/dummy_after.png'
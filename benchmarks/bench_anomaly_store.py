@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Anomaly Store Query Benchmark
+Fills a scratch AnomalyStore with random anomalies over ~India and times
+half-degree bbox queries over the last 30 days, then a full re-score of
+the history with src.pipeline.risk_scoring.
+
+Usage: python -m benchmarks.bench_anomaly_store [records]     (default: 1000000)
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.pipeline.risk_scoring import RiskWeights, rescore_columns
+from src.utils.anomaly_store import AnomalyStore
+
+DAY = 86400.0
+BATCH = 50000
+
+
+def fill(store: AnomalyStore, records: int, now: float, rng: random.Random):
+    classes = ["Vehicle", "New Structure", "Aircraft", "Vessel"]
+    for start in range(0, records, BATCH):
+        items = []
+        for _ in range(min(BATCH, records - start)):
+            lng, lat = rng.uniform(68.0, 97.0), rng.uniform(8.0, 37.0)
+            items.append({"bbox": [lng, lat, lng + 0.0005, lat + 0.0005],
+                          "class": rng.choice(classes), "type": "New Anomaly",
+                          "confidence": rng.random(), "changed_fraction": rng.random()})
+        store.add(items, analysis_id=f"bench-{start}", risk_score=rng.uniform(0, 10),
+                  observed_at=now - rng.uniform(0, 365 * DAY), ssim_score=rng.uniform(0.5, 1.0))
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(0)
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnomalyStore(os.path.join(tmp, "anomalies.sqlite"))
+        start = time.perf_counter()
+        fill(store, records, now, rng)
+        print(f"Inserted {records} anomalies in {time.perf_counter() - start:.1f}s")
+
+        timings, hits = [], 0
+        for _ in range(200):
+            lng, lat = rng.uniform(68.0, 96.0), rng.uniform(8.0, 36.0)
+            start = time.perf_counter()
+            hits += len(store.query(lng, lat, lng + 0.5, lat + 0.5, since=now - 30 * DAY, until=now))
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"bbox 0.5deg x 0.5deg, last 30 days: p50 {timings[100]:.2f} ms, "
+              f"p99 {timings[198]:.2f} ms, max {timings[-1]:.2f} ms, "
+              f"avg {hits / len(timings):.1f} hits")
+
+        weights = RiskWeights.from_config(class_weights={"Vehicle": 2.0, "Aircraft": 5.0},
+                                          confidence_weight=0.5, change_weight=0.5)
+        start = time.perf_counter()
+        columns = store.scoring_columns()
+        analyses = store.analysis_columns()
+        loaded = time.perf_counter() - start
+        analysis_ids, _ = rescore_columns(columns, weights, analyses)
+        print(f"Re-scored {len(columns['class'])} anomalies into {len(analysis_ids)} analyses: "
+              f"load {loaded:.2f}s, score {time.perf_counter() - start - loaded:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Inference Backend Benchmark
+Compares the eager PyTorch ViT with the TorchScript and ONNX Runtime
+backends, each in float32 and int8 dynamic quantization, on 224x224 crops
+of the demo imagery.
+
+Reports artifact build/load time, p50 latency at batch 1 and batch 8, the
+process's peak RSS and top-1 agreement with the eager float32 model. Each
+configuration runs in its own subprocess so memory numbers do not bleed
+into each other. The first run of a backend includes exporting its
+artifact; run again for load-from-cache numbers.
+
+Usage: python -m benchmarks.bench_inference_backends [--repeat 10]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+CONFIGS = [("eager", False), ("eager", True), ("torchscript", False), ("torchscript", True),
+           ("onnx", False), ("onnx", True)]
+IMAGES = ["data/dummy_after.png", "data/dummy_before.png"]
+
+
+def sample_crops(count: int = 32):
+    """224px crops of the demo images plus flips, so top-1 compares real content."""
+    from src.utils.image_utils import load_image
+    crops = []
+    for path in IMAGES:
+        image = load_image(path, "rgb")
+        h, w = image.shape[:2]
+        for y in range(0, max(h - 224, 0) + 1, max((h - 224) // 3, 1)):
+            for x in range(0, max(w - 224, 0) + 1, max((w - 224) // 3, 1)):
+                crop = image[y:y + 224, x:x + 224]
+                crops.extend([crop, crop[:, ::-1]])
+    rng = np.random.default_rng(0)
+    while len(crops) < count:
+        crops.append(rng.integers(0, 255, (224, 224, 3), dtype=np.uint8))
+    return crops[:count]
+
+
+def run_one(backend: str, quantize: bool, repeat: int) -> dict:
+    """Runs in the child process."""
+    from src import config
+    config.INFERENCE_BACKEND = backend
+    config.INFERENCE_QUANTIZE = quantize
+    from src.pipeline import object_detection
+
+    crops = sample_crops()
+    processor = object_detection.get_processor()
+    pixel_values = processor(images=crops, return_tensors="np")["pixel_values"].astype(np.float32)
+
+    start = time.perf_counter()
+    model = object_detection.get_backend()
+    model(pixel_values[:1])
+    load_s = time.perf_counter() - start
+
+    def p50(batch):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model(batch)
+            times.append(time.perf_counter() - start)
+        return float(np.median(times)) * 1000
+
+    top1 = model(pixel_values).argmax(axis=-1).tolist()
+    return {"load_s": load_s, "b1_ms": p50(pixel_values[:1]), "b8_ms": p50(pixel_values[:8]),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            "top1": top1}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--one", nargs=2, metavar=("BACKEND", "QUANTIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        print(json.dumps(run_one(args.one[0], args.one[1] == "1", args.repeat)))
+        return
+
+    results = {}
+    for backend, quantize in CONFIGS:
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_inference_backends", "--repeat", str(args.repeat),
+             "--one", backend, "1" if quantize else "0"],
+            capture_output=True, text=True, env=os.environ.copy())
+        lines = child.stdout.strip().splitlines()
+        try:
+            results[(backend, quantize)] = json.loads(lines[-1])
+        except (IndexError, ValueError):
+            error = (child.stderr.strip().splitlines() or ["no output"])[-1]
+            results[(backend, quantize)] = {"error": error}
+
+    reference = results.get(("eager", False), {}).get("top1")
+    print(f"{'backend':>12} {'prec':>5} {'load s':>7} {'b1 ms':>8} {'b8 ms':>8} "
+          f"{'img/s b8':>9} {'peak MB':>8} {'top-1 agree':>12}")
+    for (backend, quantize), r in results.items():
+        precision = "int8" if quantize else "fp32"
+        if "error" in r:
+            print(f"{backend:>12} {precision:>5}  failed: {r['error']}")
+            continue
+        agree = (f"{np.mean(np.array(r['top1']) == np.array(reference)):11.1%}"
+                 if reference else f"{'n/a':>11}")
+        print(f"{backend:>12} {precision:>5} {r['load_s']:7.1f} {r['b1_ms']:8.1f} {r['b8_ms']:8.1f} "
+              f"{8000.0 / r['b8_ms']:9.1f} {r['peak_rss_mb']:8.0f} {agree:>12}")
+
+
+if __name__ == "__main__":
+    main()
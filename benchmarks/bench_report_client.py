@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Report Client Benchmark
+Starts the stand-in LLM server and measures ReportClient under concurrent
+load: cold reports (distinct contexts, bounded by max concurrency), warm
+reports (served from the context cache), the template fallback when
+the budget is shorter than the LLM latency, and the same contexts again
+once the late LLM reports have landed in the cache.
+
+Usage: python -m benchmarks.bench_report_client [--reports 64] [--latency-ms 500]
+                                                [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_llm_server import serve
+from src.pipeline.report_generator import ReportClient
+
+
+def context(i: int) -> dict:
+    return {"aoi_coordinates": {"south_west": {"lat": 28.5 + i * 1e-3, "lng": 77.0},
+                                "north_east": {"lat": 28.7, "lng": 77.2}},
+            "detected_anomalies": [{"class": "Vehicle", "type": "New Anomaly"}] * (i % 5),
+            "overall_ssim_score": 0.8, "risk_score": 5.0}
+
+
+async def timed(client: ReportClient, contexts: list) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(client.generate(c, c["risk_score"]) for c in contexts))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server = serve(0, args.latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    contexts = [context(i) for i in range(args.reports)]
+
+    async def run():
+        client = ReportClient(base_url=base_url, api_key="stub", max_concurrency=args.concurrency,
+                              budget_s=60.0)
+        cold = await timed(client, contexts)
+        warm = await timed(client, contexts)
+        print(f"cold: {args.reports} reports in {cold:.2f}s "
+              f"(ideal {args.reports / args.concurrency * args.latency_ms / 1000:.2f}s)")
+        print(f"warm: {args.reports} reports in {warm * 1000:.1f} ms  {client.stats}")
+
+        tight = ReportClient(base_url=base_url, api_key="stub", budget_s=args.latency_ms / 2000)
+        fallback = await timed(tight, contexts[:8])
+        print(f"budget {tight.budget_s * 1000:.0f} ms: 8 reports in {fallback:.2f}s  {tight.stats}")
+        await asyncio.sleep(args.latency_ms / 1000)
+        late = await timed(tight, contexts[:8])
+        print(f"after late replies: 8 reports in {late * 1000:.1f} ms  {tight.stats}")
+
+    asyncio.run(run())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+SSIM Parity & Speed Benchmark
+Compares src.pipeline.ssim.fast_ssim with skimage's structural_similarity
+on synthetic scenes and checks the tolerance documented in ssim.py.
+
+Usage: python -m benchmarks.bench_ssim [size ...]     (default: 512 4096 16384)
+
+skimage needs roughly 100 bytes per pixel, so the 16k reference run wants
+~27 GB of RAM; it is reported as skipped if it runs out of memory.
+"""
+
+import sys
+import time
+
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity
+
+from src.pipeline.ssim import fast_ssim, ssim_to_diff
+
+SCORE_TOL = 1e-5
+MAP_TOL = 1e-4
+
+
+def make_pair(size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    before = cv2.GaussianBlur((rng.random((size, size)) * 255).astype(np.uint8), (0, 0), 2)
+    after = cv2.add(before, rng.integers(0, 8, (size, size), dtype=np.uint8))
+    for _ in range(max(size // 32, 1)):
+        x, y = rng.integers(0, size, 2)
+        cv2.circle(after, (int(x), int(y)), int(rng.integers(4, 40)), int(rng.integers(0, 255)), -1)
+    return before, after
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or [512, 4096, 16384]
+    print(f"{'size':>6} {'skimage ms':>11} {'fast ms':>9} {'speedup':>8} "
+          f"{'d_score':>9} {'max d_map':>10} {'diff px':>8}  ok")
+
+    for size in sizes:
+        before, after = make_pair(size)
+        repeat = 3 if size <= 4096 else 1
+        fast_time, (fast_score, fast_map) = timed(fast_ssim, before, after, repeat=repeat)
+
+        try:
+            ref_time, (ref_score, ref_map) = timed(
+                lambda a, b: structural_similarity(a, b, full=True), before, after, repeat=repeat)
+        except MemoryError:
+            print(f"{size:>6} {'skipped':>11} {fast_time * 1000:9.1f}   (skimage out of memory)")
+            continue
+
+        d_score = abs(fast_score - ref_score)
+        d_map = float(np.abs(fast_map - ref_map).max())
+        diff_mismatch = int(np.count_nonzero(
+            np.abs(ssim_to_diff(fast_map).astype(np.int16) - ssim_to_diff(ref_map)) > 1))
+        ok = d_score <= SCORE_TOL and d_map <= MAP_TOL and diff_mismatch == 0
+        print(f"{size:>6} {ref_time * 1000:11.1f} {fast_time * 1000:9.1f} "
+              f"{ref_time / fast_time:7.1f}x {d_score:9.1e} {d_map:10.1e} {diff_mismatch:8d}  "
+              f"{'yes' if ok else 'NO'}")
+        del ref_map, fast_map
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Micro-Batching Load Test
+Drives the BatchScheduler with concurrent closed-loop clients and reports
+throughput against median and p99 latency for a grid of max batch size /
+max wait settings. The batch-size-1 row is the unbatched baseline.
+
+Usage: python -m benchmarks.load_test_batching [--clients 16] [--requests 20]
+                                               [--simulate]
+
+By default the real ViT forward pass (object_detection._infer_batch) is
+used. --simulate replaces it with a latency model of a batched CPU forward
+pass (fixed overhead + per-image cost) so the scheduler can be exercised
+without torch or the model weights.
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from src.pipeline.batching import BatchScheduler
+
+# (max_batch_size, max_wait_ms)
+GRID = [(1, 0.0), (4, 5.0), (8, 5.0), (8, 10.0), (16, 10.0), (16, 25.0)]
+
+
+def simulated_infer_batch(overhead_ms: float, per_item_ms: float):
+    def infer(items):
+        time.sleep((overhead_ms + per_item_ms * len(items)) / 1000.0)
+        return [None] * len(items)
+    return infer
+
+
+def run(scheduler: BatchScheduler, image: np.ndarray, clients: int, requests: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        own = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            scheduler.infer(image)
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--overhead-ms", type=float, default=30.0)
+    parser.add_argument("--per-item-ms", type=float, default=6.0)
+    args = parser.parse_args()
+
+    if args.simulate:
+        infer_batch = simulated_infer_batch(args.overhead_ms, args.per_item_ms)
+    else:
+        from src.pipeline import object_detection
+        object_detection.warm_up()
+        infer_batch = object_detection._infer_batch
+    image = np.random.default_rng(0).integers(0, 255, (224, 224, 3), dtype=np.uint8)
+
+    print(f"{args.clients} clients x {args.requests} requests"
+          f"{' (simulated model)' if args.simulate else ''}")
+    print(f"{'batch':>5} {'wait ms':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11}")
+    for max_batch, max_wait in GRID:
+        scheduler = BatchScheduler(infer_batch, max_batch_size=max_batch, max_wait_ms=max_wait)
+        throughput, latencies = run(scheduler, image, args.clients, args.requests)
+        scheduler.close()
+        print(f"{max_batch:>5} {max_wait:8.1f} {throughput:8.1f} "
+              f"{np.percentile(latencies, 50):8.1f} {np.percentile(latencies, 99):8.1f} "
+              f"{scheduler.mean_batch_size:11.2f}")
+
+
+if __name__ == "__main__":
+    main()
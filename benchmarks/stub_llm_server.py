@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Stand-in LLM Server
+A local OpenAI-compatible /v1/chat/completions endpoint for tests and
+benchmarks. It answers every request with the template report for the
+posted context after a configurable latency, so report generation can be
+exercised and load-tested without an API key or network access.
+
+Usage: python -m benchmarks.stub_llm_server [--port 8089] [--latency-ms 800]
+       DRISHTI_LLM_BASE_URL=http://127.0.0.1:8089/v1 python api_server.py
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.pipeline.report_generator import template_report
+
+
+def make_handler(latency_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+            try:
+                context = json.loads(user.split("\n\n", 1)[1])
+                content = template_report(context, context.get("risk_score", 0.0))
+            except (IndexError, ValueError, AttributeError, TypeError):
+                content = "**BLUF (Bottom Line Up Front):** Stub report."
+            time.sleep(latency_s)
+
+            payload = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int = 0, latency_ms: float = 800.0) -> ThreadingHTTPServer:
+    """Starts the stub in a daemon thread; returns the server (see server_address)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms / 1000.0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    args = parser.parse_args()
+    server = serve(args.port, args.latency_ms)
+    print(f"Stub LLM on http://127.0.0.1:{server.server_address[1]}/v1 ({args.latency_ms:.0f} ms per report)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
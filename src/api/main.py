@@ -1,10 +1,11 @@
 import os
 import sys
-import shutil
 import cv2
 import numpy as np
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 
@@ -14,10 +15,17 @@ sys.path.insert(0, project_root)
 
 # Import your pipeline functions
 try:
-    from src.pipeline.object_detection import detect_objects
+    from src import config
+    from src.api.results import router as results_router
+    from src.api.uploads import read_upload
+    from src.pipeline import object_detection
+    from src.pipeline.object_detection import detect_objects, detect_objects_tiled
     from src.pipeline.change_detection import detect_changes
+    from src.pipeline.preprocessing import Scene
     from src.pipeline.report_generator import generate_intelligence_summary
+    from src.utils import metrics
     from src.utils.geo_utils import convert_to_geojson
+    from src.utils.result_store import default_store as result_store
 except ImportError as e:
     print(f"Import error: {e}")
     # Fallback imports with absolute paths
@@ -45,11 +53,97 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+app.middleware("http")(metrics.server_timing_middleware)
+# Stored masks by digest (GET /api/v1/results/{digest}), shared with the V2 API
+app.include_router(results_router)
+
+@app.on_event("startup")
+def start_model_warmup():
+    # Model loading is lazy; warm it in the background so startup is instant
+    if config.MODEL_WARMUP_ON_STARTUP:
+        object_detection.warm_up(background=True)
 
 @app.get("/")
 async def root():
     return {"message": "DRISHTI-SHIELD API is running!"}
 
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once the detection model is loaded, else 503."""
+    status = object_detection.model_status()
+    return JSONResponse(status_code=200 if status["loaded"] else 503,
+                        content={"ready": status["loaded"], **status})
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency and memory histograms in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def _decode_upload(data: bytearray, filename: str) -> np.ndarray:
+    """Decodes upload bytes into a BGR array (400 if they are not an image)."""
+    with metrics.span("decode"):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    if image is None:
+        raise HTTPException(status_code=400, detail=f"Could not decode {filename}.")
+    return image
+
+
+def _analyze_uploads(before: tuple, after: tuple) -> dict:
+    """
+    Decodes the (bytes, filename) uploads and runs the pipeline on them;
+    CPU-bound, called off the event loop.
+    """
+    img_before, img_after = _decode_upload(*before), _decode_upload(*after)
+
+    # --- 1. Run the ML Pipeline ---
+    print("[API] Running change detection...")
+    # Gray and RGB views are derived once from the decoded uploads
+    before, after = Scene(bgr=img_before, name="image_before"), Scene(bgr=img_after, name="image_after")
+    change_mask_array = detect_changes(before.gray, after.gray)
+
+    # Per-request mask, addressed by its content instead of a shared file
+    _, mask_png = cv2.imencode(".png", change_mask_array)
+    change_mask_url = f"/api/v1/results/{result_store.put(mask_png.tobytes(), 'image/png')}"
+
+    print("[API] Running object detection...")
+    if config.DETECTION_TILED:
+        # Only tiles overlapping the change mask go through the ViT
+        detections = detect_objects_tiled(after, change_mask_array)
+    else:
+        detections = detect_objects(after) # Your ViT model
+
+    # --- 2. Run Fusion & Risk Scoring ---
+    # This is where you combine detections and changes
+    # (This is your fusion logic from the blueprint)
+    fused_data = [
+        {"type": "new_object", "class": "vehicle", "count": 12, "bbox_pixels": [100, 100, 150, 150]},
+        {"type": "new_structure", "class": "building", "area_pixels": 500, "bbox_pixels": [300, 300, 400, 400]}
+    ]
+    mock_risk_score = 9.2 # Placeholder
+
+    # --- 3. CRITICAL UPGRADE: Convert to GeoJSON ---
+    print("[API] Converting pixel coordinates to GeoJSON...")
+    # We need the original image's geo-reference (lat/lng bounds)
+    # For a demo, we can mock this.
+    image_bounds_latlng = [[40.712, -74.227], [40.774, -74.125]] # Mock bounds (NYC area)
+    anomalies_geojson = convert_to_geojson(fused_data, image_bounds_latlng,
+                                           image_dims=change_mask_array.shape[:2])
+
+    # --- 4. Generate LLM Report ---
+    print("[API] Generating final report...")
+    report_text = generate_intelligence_summary(fused_data, mock_risk_score)
+
+    # --- 5. Send Response to Frontend ---
+    return {
+        "report_summary": report_text,
+        "change_mask_url": change_mask_url,
+        "anomalies_geojson": anomalies_geojson,
+        "image_bounds": image_bounds_latlng, # Tell frontend where to draw the map
+        "detections": detections,  # Include raw detection results
+        "risk_score": mock_risk_score
+    }
+
+
 @app.post("/api/v1/analyze")
 async def analyze_imagery(
     image_before: UploadFile = File(...),
@@ -58,68 +152,22 @@ async def analyze_imagery(
     """
     The main analysis endpoint. Receives "before" and "after" images,
     runs the full pipeline, and returns a JSON report.
+
+    Uploads are decoded in memory and outputs go to the result store, so
+    nothing is written to disk and concurrent requests stay isolated.
     """
+    before = (await read_upload(image_before), image_before.filename)
+    after = (await read_upload(image_after), image_after.filename)
     try:
-        # Ensure upload directory exists
-        os.makedirs("data/uploads", exist_ok=True)
-        os.makedirs("static", exist_ok=True)
-        
-        # Save uploaded files temporarily
-        # (In production, you'd use a unique ID)
-        before_path = "data/uploads/before.png"
-        after_path = "data/uploads/after.png"
-        
-        with open(before_path, "wb") as buffer:
-            shutil.copyfileobj(image_before.file, buffer)
-        with open(after_path, "wb") as buffer:
-            shutil.copyfileobj(image_after.file, buffer)
-
-        # --- 1. Run the ML Pipeline ---
-        print("[API] Running change detection...")
-        change_mask_array = detect_changes(before_path, after_path)
-        
-        # Save the change mask as an image file
-        change_mask_path = "static/change_mask.png"
-        cv2.imwrite(change_mask_path, change_mask_array)
-        change_mask_url = "/static/change_mask.png"
-        
-        print("[API] Running object detection...")
-        detections = detect_objects(after_path) # Your ViT model
-
-        # --- 2. Run Fusion & Risk Scoring ---
-        # This is where you combine detections and changes
-        # (This is your fusion logic from the blueprint)
-        fused_data = [
-            {"type": "new_object", "class": "vehicle", "count": 12, "bbox_pixels": [100, 100, 150, 150]},
-            {"type": "new_structure", "class": "building", "area_pixels": 500, "bbox_pixels": [300, 300, 400, 400]}
-        ]
-        mock_risk_score = 9.2 # Placeholder
-
-        # --- 3. CRITICAL UPGRADE: Convert to GeoJSON ---
-        print("[API] Converting pixel coordinates to GeoJSON...")
-        # We need the original image's geo-reference (lat/lng bounds)
-        # For a demo, we can mock this.
-        image_bounds_latlng = [[40.712, -74.227], [40.774, -74.125]] # Mock bounds (NYC area)
-        anomalies_geojson = convert_to_geojson(fused_data, image_bounds_latlng)
-
-        # --- 4. Generate LLM Report ---
-        print("[API] Generating final report...")
-        report_text = generate_intelligence_summary(fused_data, mock_risk_score)
-
-        # --- 5. Send Response to Frontend ---
-        return {
-            "report_summary": report_text,
-            "change_mask_url": change_mask_url,
-            "anomalies_geojson": anomalies_geojson,
-            "image_bounds": image_bounds_latlng, # Tell frontend where to draw the map
-            "detections": detections,  # Include raw detection results
-            "risk_score": mock_risk_score
-        }
-
+        # Decoding runs with the pipeline, so large images never block the loop
+        return await run_in_threadpool(_analyze_uploads, before, after)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[API Error] {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
 if __name__ == "__main__":
     # This runs the backend server
     uvicorn.run(app, host="127.0.0.1", port=8000)
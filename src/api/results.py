@@ -0,0 +1,23 @@
+"""
+Result Endpoint
+Serves blobs from the content-addressed result store; included by both
+API apps so they share one route.
+"""
+
+from fastapi import APIRouter, HTTPException, Response
+
+from src.utils.result_store import default_store as result_store
+
+router = APIRouter()
+
+
+@router.get("/api/v1/results/{digest}")
+def get_result(digest: str):
+    """Serves a stored per-request output (e.g. a change mask) by its SHA-256."""
+    entry = result_store.get(digest)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired result.")
+    data, media_type = entry
+    # Content-addressed, so the bytes behind a digest never change
+    return Response(content=data, media_type=media_type,
+                    headers={"ETag": f'"{digest}"', "Cache-Control": "public, max-age=31536000, immutable"})
@@ -0,0 +1,30 @@
+"""
+Upload Reading
+Size-capped reading of multipart uploads, shared by both API apps.
+"""
+
+from fastapi import HTTPException, UploadFile
+
+from src import config
+
+CHUNK_BYTES = 1024 * 1024
+
+
+async def read_upload(upload: UploadFile) -> bytearray:
+    """
+    Reads an upload's encoded bytes into one buffer.
+
+    Reads in chunks so an oversized upload is rejected (413) after at most
+    UPLOAD_MAX_MB instead of being buffered whole.
+    """
+    limit = config.UPLOAD_MAX_MB * 1024 * 1024
+    data = bytearray()
+    while True:
+        chunk = await upload.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        if len(data) + len(chunk) > limit:
+            raise HTTPException(status_code=413,
+                                detail=f"{upload.filename} exceeds {config.UPLOAD_MAX_MB} MB.")
+        data += chunk
+    return data
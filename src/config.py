@@ -0,0 +1,183 @@
+"""
+DRISHTI-SHIELD Runtime Configuration
+Tunables are read from environment variables so deployments can adjust
+them without code changes (same approach as OPENAI_API_KEY).
+"""
+
+import json
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_json(name: str, default):
+    value = os.environ.get(name)
+    return json.loads(value) if value not in (None, "") else default
+
+
+# --- Change Detection ---
+# Working-memory budget for the tiled change-detection engine. Scenes whose
+# full-frame working set would exceed this are processed window by window.
+CHANGE_DETECTION_MEMORY_BUDGET_MB = _env_int("DRISHTI_CD_MEMORY_BUDGET_MB", 512)
+
+# Worker threads used to process change-detection tiles in parallel.
+CHANGE_DETECTION_WORKERS = _env_int("DRISHTI_CD_WORKERS", os.cpu_count() or 1)
+
+# Tile core size (pixels) for parallel in-memory change detection.
+CHANGE_DETECTION_TILE_SIZE = _env_int("DRISHTI_CD_TILE_SIZE", 1024)
+
+# Coarse-to-fine mode: screen for change on an image pyramid and only run
+# full-resolution change detection on blocks flagged at the coarse level.
+CHANGE_DETECTION_COARSE_TO_FINE = _env_bool("DRISHTI_CD_COARSE_TO_FINE", False)
+PYRAMID_LEVELS = _env_int("DRISHTI_CD_PYRAMID_LEVELS", 3)          # 1/8 resolution
+PYRAMID_BLOCK_SIZE = _env_int("DRISHTI_CD_PYRAMID_BLOCK_SIZE", 256)
+# Screening thresholds: lower values favour recall, higher values skip more.
+PYRAMID_SSIM_SCREEN = _env_float("DRISHTI_CD_PYRAMID_SSIM_SCREEN", 0.2)   # 1 - SSIM
+PYRAMID_DIFF_SCREEN = _env_float("DRISHTI_CD_PYRAMID_DIFF_SCREEN", 10.0)  # grey levels
+
+# --- Time-Series Change Detection ---
+TIMESERIES_DIR = os.environ.get("DRISHTI_TIMESERIES_DIR", "data/timeseries")
+# EWMA weight of each new acquisition once the baseline has warmed up.
+TIMESERIES_ALPHA = _env_float("DRISHTI_TIMESERIES_ALPHA", 0.1)
+# A pixel is changed when it deviates more than this many standard deviations.
+TIMESERIES_Z_THRESHOLD = _env_float("DRISHTI_TIMESERIES_Z", 3.0)
+# Floor on the per-pixel standard deviation (grey levels), so pixels that
+# have been perfectly stable do not flag sensor noise as change.
+TIMESERIES_MIN_STD = _env_float("DRISHTI_TIMESERIES_MIN_STD", 6.0)
+# Acquisitions needed before change masks are emitted.
+TIMESERIES_MIN_OBSERVATIONS = _env_int("DRISHTI_TIMESERIES_MIN_OBS", 2)
+# Rows processed per strip when updating the on-disk baseline.
+TIMESERIES_STRIP_ROWS = _env_int("DRISHTI_TIMESERIES_STRIP_ROWS", 512)
+
+# --- Image Cache ---
+# Byte budget of the process-wide decoded-image cache.
+IMAGE_CACHE_MAX_MB = _env_int("DRISHTI_IMAGE_CACHE_MB", 1024)
+
+# --- Object Detection ---
+# Load and warm up the ViT in a background thread when the API starts.
+MODEL_WARMUP_ON_STARTUP = _env_bool("DRISHTI_MODEL_WARMUP", True)
+# Micro-batching: concurrent detect_objects calls share one forward pass.
+# A batch runs when it is full or its first request has waited max-wait ms.
+INFERENCE_BATCHING = _env_bool("DRISHTI_INFERENCE_BATCHING", True)
+INFERENCE_MAX_BATCH_SIZE = _env_int("DRISHTI_INFERENCE_MAX_BATCH", 8)
+INFERENCE_MAX_WAIT_MS = _env_float("DRISHTI_INFERENCE_MAX_WAIT_MS", 10.0)
+# Tiled detection: classify window-sized tiles that overlap the change mask
+# instead of the whole scene resized to the model's input size.
+DETECTION_TILED = _env_bool("DRISHTI_DETECTION_TILED", True)
+DETECTION_WINDOW = _env_int("DRISHTI_DETECTION_WINDOW", 224)
+DETECTION_STRIDE = _env_int("DRISHTI_DETECTION_STRIDE", 224)
+# Changed pixels a tile needs before it is sent to the model.
+DETECTION_MIN_CHANGED_PIXELS = _env_int("DRISHTI_DETECTION_MIN_CHANGED", 64)
+# Inference runtime: "eager" (PyTorch), "torchscript" or "onnx" (ONNX
+# Runtime), optionally with int8 dynamic quantization. Exported artifacts
+# are cached in INFERENCE_ARTIFACT_DIR.
+INFERENCE_BACKEND = os.environ.get("DRISHTI_INFERENCE_BACKEND", "eager")
+INFERENCE_QUANTIZE = _env_bool("DRISHTI_INFERENCE_QUANTIZE", False)
+INFERENCE_ARTIFACT_DIR = os.environ.get("DRISHTI_INFERENCE_ARTIFACT_DIR", "data/models")
+# Intra-op threads for the inference runtime (0 = runtime default).
+INFERENCE_THREADS = _env_int("DRISHTI_INFERENCE_THREADS", 0)
+
+# --- Job Queue ---
+# Worker threads running analyses off the API's event loop.
+JOB_WORKERS = _env_int("DRISHTI_JOB_WORKERS", 2)
+# Jobs allowed to wait for a worker before submissions get a 429.
+JOB_QUEUE_MAX = _env_int("DRISHTI_JOB_QUEUE_MAX", 8)
+# Seconds a finished job's result stays available for polling.
+JOB_RESULT_TTL_S = _env_float("DRISHTI_JOB_RESULT_TTL_S", 3600.0)
+# Retry-After hint (seconds) sent with 429 responses.
+JOB_RETRY_AFTER_S = _env_int("DRISHTI_JOB_RETRY_AFTER_S", 5)
+
+# --- Uploads & Results ---
+# Largest accepted upload per image; bigger uploads get a 413.
+UPLOAD_MAX_MB = _env_int("DRISHTI_UPLOAD_MAX_MB", 256)
+# Byte budget of the in-memory, content-addressed result store.
+RESULT_STORE_MAX_MB = _env_int("DRISHTI_RESULT_STORE_MB", 256)
+# Origin the V2 API prefixes to the result, tile and footprint URLs it returns.
+API_BASE_URL = os.environ.get("DRISHTI_API_BASE_URL", "http://127.0.0.1:8000").rstrip("/")
+
+# --- Batch AOI Analysis ---
+# Most AOIs accepted by one /api/v1/analyze_aoi/batch request.
+AOI_BATCH_MAX = _env_int("DRISHTI_AOI_BATCH_MAX", 1000)
+
+# --- AOI Analysis Cache ---
+# AOI bounds are snapped outward to this grid (degrees, ~110 m at 0.001)
+# so near-identical rectangles share one cached analysis; 0 disables snapping.
+AOI_CACHE_GRID_DEG = _env_float("DRISHTI_AOI_CACHE_GRID_DEG", 0.001)
+AOI_CACHE_TTL_S = _env_float("DRISHTI_AOI_CACHE_TTL_S", 3600.0)
+# Cached analyses kept; least recently used ones are evicted beyond this.
+AOI_CACHE_MAX_ENTRIES = _env_int("DRISHTI_AOI_CACHE_MAX_ENTRIES", 256)
+
+# --- Map Tiles ---
+# Byte budget of the change-mask pyramids kept for /tiles.
+TILE_PYRAMID_MAX_MB = _env_int("DRISHTI_TILE_PYRAMID_MB", 256)
+# Rendered tile PNGs kept in the LRU tile cache.
+TILE_CACHE_MAX_TILES = _env_int("DRISHTI_TILE_CACHE_TILES", 4096)
+
+# --- Change Footprints ---
+# Level-of-detail name -> simplification tolerance in mask pixels for the
+# polygonized change footprint ("full" is unsimplified).
+FOOTPRINT_LODS = {"full": 0.0, "high": 1.0, "medium": 4.0, "low": 16.0}
+# Analyses whose polygons (and per-LOD GeoJSON) are kept.
+FOOTPRINT_CACHE_MAX = _env_int("DRISHTI_FOOTPRINT_CACHE_MAX", 64)
+
+# --- Anomaly Store ---
+# SQLite database recording every fused anomaly (R-tree indexed by bbox and time).
+ANOMALY_DB_PATH = os.environ.get("DRISHTI_ANOMALY_DB", "data/anomalies.sqlite")
+
+# --- Fusion ---
+# A detection is a new anomaly when at least this fraction of its box, and
+# at least this many pixels, are changed in the change mask.
+FUSION_MIN_CHANGED_FRACTION = _env_float("DRISHTI_FUSION_MIN_CHANGED_FRACTION", 0.25)
+FUSION_MIN_CHANGED_PIXELS = _env_int("DRISHTI_FUSION_MIN_CHANGED_PIXELS", 16)
+
+# --- Risk Scoring ---
+# AOI risk = sum over new anomalies of class weight x confidence term x
+# change term, plus RISK_SSIM_WEIGHT x (1 - SSIM), clamped to 0..RISK_MAX_SCORE.
+# The confidence / change terms blend from 1 (weight 0, ignored) to the
+# detection's confidence / changed fraction (weight 1).
+RISK_CLASS_WEIGHTS = _env_json("DRISHTI_RISK_CLASS_WEIGHTS", {})  # e.g. {"Vehicle": 2.0}
+RISK_DEFAULT_CLASS_WEIGHT = _env_float("DRISHTI_RISK_DEFAULT_CLASS_WEIGHT", 3.0)
+RISK_CONFIDENCE_WEIGHT = _env_float("DRISHTI_RISK_CONFIDENCE_WEIGHT", 0.0)
+RISK_CHANGE_WEIGHT = _env_float("DRISHTI_RISK_CHANGE_WEIGHT", 0.0)
+RISK_SSIM_WEIGHT = _env_float("DRISHTI_RISK_SSIM_WEIGHT", 10.0)
+RISK_MAX_SCORE = _env_float("DRISHTI_RISK_MAX_SCORE", 10.0)
+
+# --- Report Generation ---
+# Reports come from an OpenAI-compatible chat endpoint when OPENAI_API_KEY
+# or DRISHTI_LLM_BASE_URL is set (e.g. benchmarks/stub_llm_server.py),
+# otherwise from the built-in template.
+LLM_BASE_URL = os.environ.get("DRISHTI_LLM_BASE_URL", "")
+LLM_MODEL = os.environ.get("DRISHTI_LLM_MODEL", "gpt-4o-mini")
+# Pooled HTTP connections and concurrent requests to the LLM.
+LLM_MAX_CONNECTIONS = _env_int("DRISHTI_LLM_MAX_CONNECTIONS", 16)
+LLM_MAX_CONCURRENCY = _env_int("DRISHTI_LLM_MAX_CONCURRENCY", 8)
+# Per-attempt timeout and retries, and how long a job waits for a report
+# (queueing included) before using the template instead; the LLM call
+# carries on and caches its report for the next identical request.
+LLM_TIMEOUT_S = _env_float("DRISHTI_LLM_TIMEOUT_S", 20.0)
+LLM_MAX_RETRIES = _env_int("DRISHTI_LLM_MAX_RETRIES", 2)
+LLM_REPORT_BUDGET_S = _env_float("DRISHTI_LLM_REPORT_BUDGET_S", 2.0)
+# LLM reports cached by a hash of their canonicalized context.
+REPORT_CACHE_MAX = _env_int("DRISHTI_REPORT_CACHE_MAX", 1024)
+
+# --- Metrics ---
+# Per-stage timing and memory spans, Prometheus histograms on /metrics and
+# Server-Timing headers; when off, the instrumentation is not even wrapped in.
+METRICS_ENABLED = _env_bool("DRISHTI_METRICS", True)
+# Also record net allocations per stage with tracemalloc (slows allocation-heavy code).
+METRICS_TRACE_ALLOCATIONS = _env_bool("DRISHTI_METRICS_TRACE_ALLOC", False)
@@ -0,0 +1,93 @@
+"""
+Batch AOI Helpers
+Plans shared scene work for many AOIs: AOIs are grouped by the scene
+that covers them, change detection runs once over each group's union
+window, and every AOI's mask, regions and detections are sliced out of
+that shared result.
+
+Bounds use the API's shape, {"north_east": {"lat", "lng"},
+"south_west": {"lat", "lng"}}. Pixel windows are (row0, col0, row1, col1),
+half-open, in the coordinates of the scene the union window was mapped to.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+from src.pipeline.regions import offset_regions
+
+
+def group_by_scene(aoi_bounds: List[dict], scene_key: Callable[[dict], Hashable]) -> "OrderedDict":
+    """Maps each scene key to the indices of its AOIs, in request order."""
+    groups = OrderedDict()
+    for index, bounds in enumerate(aoi_bounds):
+        groups.setdefault(scene_key(bounds), []).append(index)
+    return groups
+
+
+def union_bounds(aoi_bounds: List[dict]) -> dict:
+    """Smallest lat/lng box containing every AOI."""
+    return {
+        "north_east": {"lat": max(b["north_east"]["lat"] for b in aoi_bounds),
+                       "lng": max(b["north_east"]["lng"] for b in aoi_bounds)},
+        "south_west": {"lat": min(b["south_west"]["lat"] for b in aoi_bounds),
+                       "lng": min(b["south_west"]["lng"] for b in aoi_bounds)},
+    }
+
+
+def bounds_to_window(bounds: dict, scene_bounds: dict,
+                     scene_shape: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Pixel window of bounds inside a scene covering scene_bounds.
+
+    Uses the same linear lat/lng mapping as convert_pixels_to_geojson
+    (row 0 is the northern edge). The window is clamped to the scene and
+    is always at least one pixel wide and tall.
+    """
+    height, width = scene_shape
+    min_lng, max_lng = scene_bounds["south_west"]["lng"], scene_bounds["north_east"]["lng"]
+    min_lat, max_lat = scene_bounds["south_west"]["lat"], scene_bounds["north_east"]["lat"]
+    span_lng = (max_lng - min_lng) or 1.0
+    span_lat = (max_lat - min_lat) or 1.0
+
+    def clamp(value, limit):
+        return int(min(max(value, 0), limit))
+
+    col0 = clamp(np.floor((bounds["south_west"]["lng"] - min_lng) / span_lng * width), width - 1)
+    col1 = clamp(np.ceil((bounds["north_east"]["lng"] - min_lng) / span_lng * width), width)
+    row0 = clamp(np.floor((max_lat - bounds["north_east"]["lat"]) / span_lat * height), height - 1)
+    row1 = clamp(np.ceil((max_lat - bounds["south_west"]["lat"]) / span_lat * height), height)
+    return row0, col0, max(row1, row0 + 1), max(col1, col0 + 1)
+
+
+def slice_regions(regions: np.ndarray, window: Tuple[int, int, int, int]) -> np.ndarray:
+    """Regions whose centroid lies in window, shifted into window coordinates."""
+    row0, col0, row1, col1 = window
+    inside = ((regions["centroid_x"] >= col0) & (regions["centroid_x"] < col1)
+              & (regions["centroid_y"] >= row0) & (regions["centroid_y"] < row1))
+    return offset_regions(regions[inside].copy(), -row0, -col0)
+
+
+def window_ssim(diff: np.ndarray, window: Tuple[int, int, int, int], default: float) -> float:
+    """
+    Mean SSIM of a window from the scene's uint8 SSIM diff (SSIM * 255),
+    so each AOI is scored on its own pixels rather than the whole scene.
+    """
+    row0, col0, row1, col1 = window
+    pixels = diff[row0:row1, col0:col1]
+    if not pixels.size:
+        return default
+    return float(pixels.mean(dtype=np.float64) / 255.0)
+
+
+def slice_detections(detections: List[Dict], window: Tuple[int, int, int, int]) -> List[Dict]:
+    """Detections whose bbox centre lies in window, shifted into window coordinates."""
+    row0, col0, row1, col1 = window
+    sliced = []
+    for det in detections:
+        x1, y1, x2, y2 = det["bbox_pixels"]
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        if col0 <= cx < col1 and row0 <= cy < row1:
+            sliced.append({**det, "bbox_pixels": [x1 - col0, y1 - row0, x2 - col0, y2 - row0]})
+    return sliced
@@ -3,13 +3,108 @@ Advanced Change Detection Module
 Uses Structural Similarity (SSIM) for robust change detection
 """
 
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
-from typing import Tuple
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.windows import Window
+from typing import Optional, Tuple
 from PIL import Image, ImageDraw
 
-def advanced_change_detection(image_path_t0: str, image_path_t1: str):
+from src import config
+from src.pipeline.preprocessing import Scene
+from src.pipeline.regions import empty_regions, extract_change_regions, fill_holes, offset_regions
+from src.pipeline.ssim import fast_ssim, ssim_to_diff
+from src.pipeline.tiling import Tile, iter_tiles, tile_size_for_budget
+from src.utils.image_utils import load_image
+from src.utils.metrics import bind, timed
+
+# Plain PNG/JPEG scenes carry no geotransform; that is expected here
+warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
+
+# --- Tunables shared by the full-frame and tiled engines ---
+SSIM_WIN_SIZE = 7          # same uniform window as skimage's default
+MORPH_KERNEL = np.ones((5, 5), np.uint8)
+MORPH_ITERATIONS = 2
+MIN_CHANGE_AREA = 100      # Only keep changes > 100 pixels
+
+# Context each stage needs around a pixel to produce an exact result.
+SSIM_HALO = SSIM_WIN_SIZE // 2
+MORPH_HALO = 2 * 2 * MORPH_ITERATIONS * (MORPH_KERNEL.shape[0] // 2)  # open + close
+AREA_HALO = MIN_CHANGE_AREA
+
+# Rough peak working set per window pixel of each tiled pass, used to turn
+# the memory budget into a tile size.
+_SSIM_BYTES_PER_PIXEL = 48    # 2x RGB + 2x gray + fast_ssim float32 workspace + map
+_MASK_BYTES_PER_PIXEL = 8     # diff, threshold, morphology and fill buffers
+
+
+def _result(mask, score, regions, diff, return_regions: bool, return_diff: bool) -> tuple:
+    """(mask, score[, regions][, diff]) as requested by the caller."""
+    result = (mask, score)
+    if return_regions:
+        result += (regions,)
+    if return_diff:
+        result += (diff,)
+    return result
+
+
+@timed("ssim")
+def _compute_ssim(gray_t0: np.ndarray, gray_t1: np.ndarray) -> Tuple[float, np.ndarray, np.ndarray]:
+    """
+    Runs SSIM on two grayscale images.
+
+    Returns:
+        tuple: (score, ssim_map, diff) where ssim_map is the per-pixel
+               similarity and diff is it scaled to uint8 (0 = changed).
+    """
+    # 'score' is the overall similarity (1.0 = identical)
+    # 'ssim_map' is an image highlighting the differences
+    (score, ssim_map) = fast_ssim(gray_t0, gray_t1, win_size=SSIM_WIN_SIZE)
+    return score, ssim_map, ssim_to_diff(ssim_map)
+
+
+@timed("morphology")
+def _clean_mask(thresh: np.ndarray) -> np.ndarray:
+    """Removes speckle and closes gaps in a thresholded change image."""
+    mask = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, MORPH_KERNEL, iterations=MORPH_ITERATIONS)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, MORPH_KERNEL, iterations=MORPH_ITERATIONS)
+
+
+def _otsu_threshold(hist: np.ndarray) -> int:
+    """
+    Otsu's threshold from a 256-bin histogram.
+
+    Mirrors cv2.THRESH_OTSU so tiled runs can pick one global threshold
+    from histograms accumulated tile by tile.
+    """
+    p = hist.astype(np.float64) / max(hist.sum(), 1)
+    levels = np.arange(256, dtype=np.float64)
+    q1 = np.cumsum(p)
+    q2 = 1.0 - q1
+    m1 = np.cumsum(levels * p)
+    mu = m1[-1]
+
+    eps = np.finfo(np.float32).eps
+    valid = (np.minimum(q1, q2) >= eps) & (np.maximum(q1, q2) <= 1.0 - eps)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu1 = m1 / q1
+        mu2 = (mu - m1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) ** 2
+    sigma = np.where(valid, sigma, -1.0)
+    return int(np.argmax(sigma)) if valid.any() else 0
+
+
+def advanced_change_detection(image_path_t0, image_path_t1, workers: int = None,
+                              coarse_to_fine: bool = None, return_regions: bool = False,
+                              stats: dict = None, return_diff: bool = False):
     """
     Performs an advanced change detection using Structural Similarity (SSIM).
     This is much more robust than simple pixel difference.
@@ -17,29 +112,62 @@ def advanced_change_detection(image_path_t0: str, image_path_t1: str):
     In a V3 system, you would replace this function with inference
     from a trained Siamese UNet++ model from a library like
     segmentation-models-pytorch (smp).
+
+    Scenes whose full-frame working set would not fit in
+    CHANGE_DETECTION_MEMORY_BUDGET_MB are handed to
+    streaming_change_detection and processed window by window. Scenes
+    larger than one tile are split across `workers` threads (default
+    CHANGE_DETECTION_WORKERS) by parallel_change_detection.
+
+    With coarse_to_fine (default CHANGE_DETECTION_COARSE_TO_FINE) change
+    is screened on an image pyramid first and only flagged blocks are
+    processed at full resolution; stats["skipped_fraction"] reports how
+    much of the scene was skipped.
+
+    Both images may be paths, Scenes from the preprocessing stage, or
+    grayscale uint8 arrays; only scenes with a path can be streamed.
     
     Returns:
-        tuple: (binary_change_mask, ssim_score)
+        tuple: (binary_change_mask, ssim_score), plus a REGION_DTYPE array
+               of change regions when return_regions is set and the
+               uint8 SSIM diff image (SSIM * 255) when return_diff is set.
     """
+    if coarse_to_fine is None:
+        coarse_to_fine = config.CHANGE_DETECTION_COARSE_TO_FINE
     try:
-        img_t0 = cv2.imread(image_path_t0)
-        img_t1 = cv2.imread(image_path_t1)
-        
-        if img_t0 is None or img_t1 is None:
-            raise FileNotFoundError("One or both images not found.")
+        path_t0, path_t1 = _scene_path(image_path_t0), _scene_path(image_path_t1)
+        shape_t0 = _scene_shape(path_t0) if path_t0 and path_t1 else None
+        if shape_t0 is not None and shape_t0 == _scene_shape(path_t1):
+            budget = config.CHANGE_DETECTION_MEMORY_BUDGET_MB * 1024 * 1024
+            if shape_t0[0] * shape_t0[1] * _SSIM_BYTES_PER_PIXEL > budget:
+                print(f"[ChangeDetection] Scene {shape_t0} exceeds memory budget, streaming tiles.")
+                return streaming_change_detection(path_t0, path_t1, workers=workers,
+                                                  coarse_to_fine=coarse_to_fine,
+                                                  return_regions=return_regions, stats=stats,
+                                                  return_diff=return_diff)
+
+        # Grayscale views from the preprocessing stage / shared image cache
+        gray_t0 = _as_gray(image_path_t0)
+        gray_t1 = _as_gray(image_path_t1)
 
         # Resize for consistent comparison (optional, but good practice)
-        img_t1 = cv2.resize(img_t1, (img_t0.shape[1], img_t0.shape[0]))
+        if gray_t1.shape != gray_t0.shape:
+            gray_t1 = cv2.resize(gray_t1, (gray_t0.shape[1], gray_t0.shape[0]))
 
-        # Convert to grayscale for SSIM
-        gray_t0 = cv2.cvtColor(img_t0, cv2.COLOR_BGR2GRAY)
-        gray_t1 = cv2.cvtColor(img_t1, cv2.COLOR_BGR2GRAY)
+        if coarse_to_fine:
+            return pyramid_change_detection(gray_t0, gray_t1, workers=workers,
+                                            return_regions=return_regions, stats=stats,
+                                            return_diff=return_diff)
+
+        # Large scenes are split into tiles and spread over worker threads
+        workers = workers or config.CHANGE_DETECTION_WORKERS
+        if workers > 1 and max(gray_t0.shape) > config.CHANGE_DETECTION_TILE_SIZE:
+            return parallel_change_detection(gray_t0, gray_t1, workers=workers,
+                                             return_regions=return_regions, stats=stats,
+                                             return_diff=return_diff)
 
         # --- Calculate Structural Similarity (SSIM) ---
-        # 'score' is the overall similarity (1.0 = identical)
-        # 'diff' is an image highlighting the differences
-        (score, diff) = ssim(gray_t0, gray_t1, full=True)
-        diff = (diff * 255).astype("uint8")
+        score, _, diff = _compute_ssim(gray_t0, gray_t1)
         
         print(f"[ChangeDetection] Structural Similarity Score (SSIM): {score:.4f}")
 
@@ -48,48 +176,558 @@ def advanced_change_detection(image_path_t0: str, image_path_t1: str):
         thresh = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
         
         # 2. Clean up noise using morphology
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+        mask = _clean_mask(thresh)
 
-        # 3. Find contours (blobs) of change
-        contours, _ = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        final_mask = np.zeros_like(gray_t0)
-        
-        for c in contours:
-            # --- Filter out tiny, insignificant changes ---
-            if cv2.contourArea(c) > 100:  # Only draw changes > 100 pixels
-                cv2.drawContours(final_mask, [c], -1, 255, -1)  # Fill contour
+        # 3. Label blobs of change, keeping only significant ones
+        final_mask, regions = extract_change_regions(mask, diff, MIN_CHANGE_AREA)
 
-        print(f"[ChangeDetection] Generated mask with {len(contours)} contours.")
+        print(f"[ChangeDetection] Generated mask with {len(regions)} change regions.")
         # The final_mask is a clean, binary image of *significant* changes
-        return final_mask, score
+        return _result(final_mask, score, regions, diff, return_regions, return_diff)
 
     except Exception as e:
         print(f"[Error] Advanced change detection failed: {e}")
-        return np.zeros((512, 512), dtype=np.uint8), 1.0
+        empty_mask = np.zeros((512, 512), dtype=np.uint8)
+        return _result(empty_mask, 1.0, empty_regions(), np.full_like(empty_mask, 255),
+                       return_regions, return_diff)
+
+
+# --- Tiled change detection (streaming and parallel) ---
+
+def _scene_shape(image_path: str) -> Optional[Tuple[int, int]]:
+    """(height, width) from the image header, or None if unreadable."""
+    try:
+        with rasterio.open(image_path) as src:
+            return (src.height, src.width)
+    except Exception:
+        return None
+
+
+def _read_gray_window(src, tile: Tile) -> np.ndarray:
+    """Reads a tile window from a rasterio dataset as uint8 grayscale."""
+    window = Window(tile.win_col0, tile.win_row0,
+                    tile.win_col1 - tile.win_col0, tile.win_row1 - tile.win_row0)
+    bands = src.read(indexes=list(range(1, min(src.count, 3) + 1)), window=window)
+    if bands.shape[0] < 3:
+        return np.ascontiguousarray(bands[0])
+    # Rasterio yields RGB band order; same luma weights as cv2 BGR2GRAY
+    return cv2.cvtColor(np.ascontiguousarray(bands.transpose(1, 2, 0)), cv2.COLOR_RGB2GRAY)
+
+
+class _RasterPairReader:
+    """
+    Reads matching grayscale windows from a before/after pair.
+
+    Rasterio datasets must not be shared between threads, so every worker
+    thread lazily opens its own handles.
+    """
+
+    def __init__(self, image_path_t0: str, image_path_t1: str):
+        self.paths = (image_path_t0, image_path_t1)
+        self._local = threading.local()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def __call__(self, tile: Tile) -> Tuple[np.ndarray, np.ndarray]:
+        handles = getattr(self._local, "handles", None)
+        if handles is None:
+            handles = tuple(rasterio.open(path) for path in self.paths)
+            self._local.handles = handles
+            with self._lock:
+                self._opened.extend(handles)
+        return _read_gray_window(handles[0], tile), _read_gray_window(handles[1], tile)
+
+    def close(self):
+        with self._lock:
+            for src in self._opened:
+                src.close()
+            self._opened.clear()
+
+
+def _map_tiles(fn, tiles, workers: int) -> list:
+    """Runs fn over tiles, on a thread pool when workers > 1."""
+    tiles = list(tiles)
+    if workers <= 1 or len(tiles) <= 1:
+        return [fn(tile) for tile in tiles]
+    # OpenCV and NumPy release the GIL in their kernels, so threads scale
+    # without pickling tiles across process boundaries.
+    with ThreadPoolExecutor(max_workers=min(workers, len(tiles))) as pool:
+        return list(pool.map(bind(fn), tiles))
+
+
+def _tiled_ssim_pass(read_pair, height: int, width: int, tile_size: int,
+                     diff: np.ndarray, workers: int,
+                     skip_tile=None) -> Tuple[float, int, int, int]:
+    """
+    Pass 1: SSIM per tile, writing each core's uint8 diff into `diff`.
+
+    Tiles for which skip_tile(tile) is true are not read at all and are
+    recorded as unchanged (SSIM 1.0, diff 255).
+
+    Returns:
+        tuple: (global_ssim_score, otsu_threshold, num_tiles, skipped_pixels)
+    """
+    def run(tile: Tile):
+        # SSIM averages the map with a SSIM_HALO crop on each side, so
+        # each tile contributes the sum and count of its cropped core
+        r0, r1 = max(tile.row0, SSIM_HALO), min(tile.row1, height - SSIM_HALO)
+        c0, c1 = max(tile.col0, SSIM_HALO), min(tile.col1, width - SSIM_HALO)
+        crop_count = max(r1 - r0, 0) * max(c1 - c0, 0)
+
+        if skip_tile is not None and skip_tile(tile):
+            diff[tile.core] = 255
+            hist = np.zeros(256, dtype=np.int64)
+            core_pixels = (tile.row1 - tile.row0) * (tile.col1 - tile.col0)
+            hist[255] = core_pixels
+            return hist, float(crop_count), crop_count, core_pixels
+
+        gray_t0, gray_t1 = read_pair(tile)
+        _, ssim_map, tile_diff = _compute_ssim(gray_t0, gray_t1)
+        core = tile_diff[tile.core_in_window]
+        diff[tile.core] = core
+        hist = np.bincount(core.ravel(), minlength=256)
+
+        if not crop_count:
+            return hist, 0.0, 0, 0
+        ssim_sum = float(ssim_map[r0 - tile.win_row0:r1 - tile.win_row0,
+                                  c0 - tile.win_col0:c1 - tile.win_col0].sum())
+        return hist, ssim_sum, crop_count, 0
+
+    results = _map_tiles(run, iter_tiles(height, width, tile_size, SSIM_HALO), workers)
+    hist = np.sum([r[0] for r in results], axis=0)
+    ssim_sum = sum(r[1] for r in results)
+    ssim_count = sum(r[2] for r in results)
+    skipped = sum(r[3] for r in results)
+    score = ssim_sum / ssim_count if ssim_count else 1.0
+    return score, _otsu_threshold(hist), len(results), skipped
+
+
+def _tiled_mask_pass(diff: np.ndarray, threshold: int, tile_size: int,
+                     final_mask: np.ndarray, workers: int, skip_tile=None) -> np.ndarray:
+    """
+    Pass 2: threshold, morphology and blob filtering per tile.
+
+    Tiles for which skip_tile(tile) is true are written as unchanged.
+
+    Each region is reported by the tile whose core holds its bbox corner,
+    so regions are never duplicated. Regions that extend more than
+    AREA_HALO past that core have their statistics clipped to the tile.
+
+    Returns:
+        np.ndarray: REGION_DTYPE array of change regions in scene pixels.
+    """
+    height, width = diff.shape
+
+    def run(tile: Tile) -> np.ndarray:
+        if skip_tile is not None and skip_tile(tile):
+            final_mask[tile.core] = 0
+            return empty_regions()
+
+        thresh = np.where(diff[tile.window] > threshold, 0, 255).astype(np.uint8)
+        mask = _clean_mask(thresh)
+
+        # Morphology is only exact MORPH_HALO pixels in from an
+        # interior window edge, so trim that band off. Blobs that
+        # still reach a trimmed edge extend more than AREA_HALO
+        # beyond the core and are therefore large enough to keep.
+        edges = (tile.win_row0 > 0, tile.win_row1 < height,
+                 tile.win_col0 > 0, tile.win_col1 < width)
+        top, bottom, left, right = (MORPH_HALO if e else 0 for e in edges)
+        trusted = (slice(top, mask.shape[0] - bottom), slice(left, mask.shape[1] - right))
+        tile_mask, regions = extract_change_regions(
+            mask[trusted], diff[tile.window][trusted], MIN_CHANGE_AREA, keep_border_touching=edges)
+
+        r0 = tile.row0 - tile.win_row0 - top
+        c0 = tile.col0 - tile.win_col0 - left
+        final_mask[tile.core] = tile_mask[r0:r0 + tile.row1 - tile.row0,
+                                          c0:c0 + tile.col1 - tile.col0]
+
+        regions = offset_regions(regions, tile.win_row0 + top, tile.win_col0 + left)
+        owned = ((regions["y"] >= tile.row0) & (regions["y"] < tile.row1)
+                 & (regions["x"] >= tile.col0) & (regions["x"] < tile.col1))
+        return regions[owned]
+
+    tiles = iter_tiles(height, width, tile_size, MORPH_HALO + AREA_HALO)
+    regions = np.concatenate(_map_tiles(run, tiles, workers))
+    regions["label"] = np.arange(1, len(regions) + 1)
+    return regions
+
+
+def _stitched_regions(final_mask: np.ndarray, diff: np.ndarray) -> np.ndarray:
+    """
+    Exact regions for an in-memory stitched mask.
+
+    Per-tile regions clip blobs that run across several tiles; with the
+    whole mask in memory one vectorised labelling pass gives exact stats.
+    """
+    _, regions = extract_change_regions(final_mask, diff, min_area=0)
+    return regions
+
+
+def parallel_change_detection(gray_t0: np.ndarray, gray_t1: np.ndarray,
+                              workers: int = None, tile_size: int = None,
+                              return_regions: bool = False, stats: dict = None,
+                              return_diff: bool = False):
+    """
+    In-memory SSIM change detection fanned out over a thread pool.
+
+    Splits the scene into overlapping tiles and reduces them into the same
+    (final_mask, ssim_score) as a single-threaded full-frame run: per-tile
+    histograms give one global Otsu threshold, the SSIM score is the
+    pixel-weighted mean over all tiles, and holes enclosed by blobs that
+    span several tiles are filled once on the stitched mask.
+
+    Args:
+        gray_t0 (np.ndarray): "Before" grayscale image.
+        gray_t1 (np.ndarray): "After" grayscale image, same shape.
+        workers (int): Thread count. Defaults to CHANGE_DETECTION_WORKERS.
+        tile_size (int): Tile core size. Defaults to CHANGE_DETECTION_TILE_SIZE.
+        return_regions (bool): Also return the REGION_DTYPE change regions.
+        return_diff (bool): Also return the uint8 SSIM diff image (SSIM * 255),
+                            e.g. for the mean SSIM of sub-windows.
+        stats (dict): Optional dict filled with tiling statistics.
+
+    Returns:
+        tuple: (binary_change_mask, ssim_score[, regions][, diff])
+    """
+    workers = workers or config.CHANGE_DETECTION_WORKERS
+    tile_size = tile_size or config.CHANGE_DETECTION_TILE_SIZE
+    height, width = gray_t0.shape
+
+    diff = np.empty((height, width), dtype=np.uint8)
+    read_pair = lambda tile: (gray_t0[tile.window], gray_t1[tile.window])
+    score, threshold, num_tiles, _ = _tiled_ssim_pass(read_pair, height, width, tile_size, diff, workers)
+    print(f"[ChangeDetection] Parallel SSIM over {num_tiles} tiles ({workers} workers): {score:.4f}")
+
+    final_mask = np.empty((height, width), dtype=np.uint8)
+    regions = _tiled_mask_pass(diff, threshold, tile_size, final_mask, workers)
+    # Tiles only see their own part of a hole, so fill on the stitched mask
+    final_mask = fill_holes(final_mask)
+    if return_regions:
+        regions = _stitched_regions(final_mask, diff)
+
+    if stats is not None:
+        stats.update({"tile_size": tile_size, "num_tiles": num_tiles,
+                      "workers": workers, "otsu_threshold": threshold})
+
+    print(f"[ChangeDetection] Generated mask with {len(regions)} change regions.")
+    return _result(final_mask, score, regions, diff, return_regions, return_diff)
+
+
+# --- Coarse-to-fine (pyramid) screening ---
+
+def _build_pyramid_level(gray: np.ndarray, levels: int) -> np.ndarray:
+    """Gaussian pyramid image `levels` octaves below `gray`."""
+    for _ in range(levels):
+        gray = cv2.pyrDown(gray)
+    return gray
+
+
+def _read_gray_decimated(image_path: str, scale: int) -> np.ndarray:
+    """Reads a whole image downsampled by `scale` without a full-size decode buffer."""
+    with rasterio.open(image_path) as src:
+        count = min(src.count, 3)
+        out_shape = (count, -(-src.height // scale), -(-src.width // scale))
+        bands = src.read(indexes=list(range(1, count + 1)), out_shape=out_shape,
+                         resampling=Resampling.average)
+    if count < 3:
+        return np.ascontiguousarray(bands[0])
+    return cv2.cvtColor(np.ascontiguousarray(bands.transpose(1, 2, 0)), cv2.COLOR_RGB2GRAY)
+
 
+def _coarse_dissimilarity(coarse_t0: np.ndarray, coarse_t1: np.ndarray, measure: str) -> np.ndarray:
+    """Per-pixel change evidence at the coarse level (higher = more change)."""
+    if measure == "ssim" and min(coarse_t0.shape) >= SSIM_WIN_SIZE:
+        _, ssim_map = fast_ssim(coarse_t0, coarse_t1, win_size=SSIM_WIN_SIZE)
+        return 1.0 - ssim_map
+    if measure == "ssim":
+        # Too small for an SSIM window: never skip anything
+        return np.full(coarse_t0.shape, np.inf, dtype=np.float32)
+    return cv2.absdiff(coarse_t0, coarse_t1).astype(np.float32)
 
-def detect_changes(image_path_t0: str, image_path_t1: str) -> np.ndarray:
+
+def _flag_blocks(dissimilarity: np.ndarray, scale: int, full_shape: Tuple[int, int],
+                 block_size: int, threshold: float) -> np.ndarray:
+    """
+    Boolean (block_rows, block_cols) grid of full-resolution blocks that
+    need full processing.
+
+    Each block is flagged when the maximum coarse dissimilarity inside it
+    exceeds `threshold`. Flags are then grown by one block so changes that
+    straddle a block edge keep their context.
+    """
+    if block_size % scale:
+        raise ValueError("PYRAMID_BLOCK_SIZE must be a multiple of 2 ** PYRAMID_LEVELS.")
+    coarse_block = block_size // scale
+    block_rows = -(-full_shape[0] // block_size)
+    block_cols = -(-full_shape[1] // block_size)
+
+    padded = np.zeros((block_rows * coarse_block, block_cols * coarse_block), dtype=np.float32)
+    h = min(padded.shape[0], dissimilarity.shape[0])
+    w = min(padded.shape[1], dissimilarity.shape[1])
+    padded[:h, :w] = dissimilarity[:h, :w]
+    block_max = padded.reshape(block_rows, coarse_block, block_cols, coarse_block).max(axis=(1, 3))
+
+    flags = (block_max > threshold).astype(np.uint8)
+    return cv2.dilate(flags, np.ones((3, 3), np.uint8)) > 0
+
+
+def _tile_flagged(flags: np.ndarray, block_size: int, region: Tuple[slice, slice]) -> bool:
+    """Whether any flagged block intersects a (rows, cols) slice pair."""
+    rows, cols = region
+    return bool(flags[rows.start // block_size:(rows.stop - 1) // block_size + 1,
+                      cols.start // block_size:(cols.stop - 1) // block_size + 1].any())
+
+
+def pyramid_change_detection(gray_t0: np.ndarray, gray_t1: np.ndarray,
+                             workers: int = None, screen_threshold: float = None,
+                             return_regions: bool = False, stats: dict = None,
+                             return_diff: bool = False):
+    """
+    Coarse-to-fine SSIM change detection.
+
+    Builds a Gaussian pyramid PYRAMID_LEVELS octaves deep for both images,
+    computes SSIM at that coarse level and flags PYRAMID_BLOCK_SIZE blocks
+    whose coarse dissimilarity (1 - SSIM) exceeds the screening threshold.
+    Full-resolution SSIM, morphology and blob filtering run only on
+    flagged blocks; everything else is treated as unchanged (SSIM 1.0),
+    which also feeds the global Otsu threshold and SSIM score.
+
+    Args:
+        gray_t0 (np.ndarray): "Before" grayscale image.
+        gray_t1 (np.ndarray): "After" grayscale image, same shape.
+        workers (int): Thread count. Defaults to CHANGE_DETECTION_WORKERS.
+        screen_threshold (float): Coarse 1 - SSIM needed to flag a block.
+                                  Defaults to PYRAMID_SSIM_SCREEN.
+        return_regions (bool): Also return the REGION_DTYPE change regions.
+        return_diff (bool): Also return the uint8 SSIM diff image (SSIM * 255),
+                            e.g. for the mean SSIM of sub-windows.
+        stats (dict): Optional dict; receives "skipped_fraction" (share of
+                      pixels never processed at full resolution) so the
+                      threshold can be tuned against recall.
+
+    Returns:
+        tuple: (binary_change_mask, ssim_score[, regions][, diff])
+    """
+    workers = workers or config.CHANGE_DETECTION_WORKERS
+    if screen_threshold is None:
+        screen_threshold = config.PYRAMID_SSIM_SCREEN
+    block_size = config.PYRAMID_BLOCK_SIZE
+    height, width = gray_t0.shape
+    scale = 2 ** config.PYRAMID_LEVELS
+
+    coarse_t0 = _build_pyramid_level(gray_t0, config.PYRAMID_LEVELS)
+    coarse_t1 = _build_pyramid_level(gray_t1, config.PYRAMID_LEVELS)
+    flags = _flag_blocks(_coarse_dissimilarity(coarse_t0, coarse_t1, "ssim"),
+                         scale, (height, width), block_size, screen_threshold)
+
+    diff = np.empty((height, width), dtype=np.uint8)
+    read_pair = lambda tile: (gray_t0[tile.window], gray_t1[tile.window])
+    score, threshold, num_tiles, skipped = _tiled_ssim_pass(
+        read_pair, height, width, block_size, diff, workers,
+        skip_tile=lambda tile: not _tile_flagged(flags, block_size, tile.core))
+
+    final_mask = np.empty((height, width), dtype=np.uint8)
+    regions = _tiled_mask_pass(
+        diff, threshold, config.CHANGE_DETECTION_TILE_SIZE, final_mask, workers,
+        skip_tile=lambda tile: not _tile_flagged(flags, block_size, tile.window))
+    final_mask = fill_holes(final_mask)
+    if return_regions:
+        regions = _stitched_regions(final_mask, diff)
+
+    skipped_fraction = skipped / float(height * width)
+    if stats is not None:
+        stats.update({"block_size": block_size, "num_tiles": num_tiles,
+                      "flagged_blocks": int(flags.sum()), "otsu_threshold": threshold,
+                      "skipped_fraction": skipped_fraction})
+
+    print(f"[ChangeDetection] Coarse-to-fine SSIM: {score:.4f} "
+          f"({skipped_fraction:.1%} of pixels skipped)")
+    print(f"[ChangeDetection] Generated mask with {len(regions)} change regions.")
+    return _result(final_mask, score, regions, diff, return_regions, return_diff)
+
+
+def streaming_change_detection(image_path_t0: str, image_path_t1: str,
+                               memory_budget_mb: int = None,
+                               out_path: str = None,
+                               workers: int = None,
+                               coarse_to_fine: bool = None,
+                               return_regions: bool = False,
+                               stats: dict = None,
+                               return_diff: bool = False):
+    """
+    SSIM change detection that streams overlapping windows from disk.
+
+    Produces the same mask as advanced_change_detection without ever
+    holding a full-size copy of the scene in RAM. Runs in two passes:
+
+    1. SSIM per tile. The uint8 diff is spooled to a disk-backed array and
+       the diff histogram and SSIM sum are accumulated, giving one global
+       Otsu threshold and the exact global SSIM score.
+    2. Threshold, morphology and small-blob filtering per tile, reading
+       the spooled diff with enough halo that results at tile seams match
+       a full-frame run.
+
+    Both images must have the same dimensions (no resize is done here).
+    Holes inside blobs that extend more than the halo width past a tile
+    seam may stay unfilled; everything else is seam-exact. Regions are
+    extracted tile by tile, so a blob running across several tiles is
+    reported in pieces with clipped statistics.
+
+    Args:
+        image_path_t0 (str): "Before" image, any format rasterio can read.
+        image_path_t1 (str): "After" image.
+        memory_budget_mb (int): Peak working memory across all workers.
+                                Defaults to CHANGE_DETECTION_MEMORY_BUDGET_MB.
+        out_path (str): Optional .npy path for the output mask. When
+                        omitted the mask is backed by a temporary file that
+                        is unlinked before returning, so its disk space is
+                        freed with the last reference to the mask (POSIX).
+        workers (int): Thread count. Defaults to CHANGE_DETECTION_WORKERS.
+        coarse_to_fine (bool): Screen decimated reads first and skip
+                               unchanged blocks (see pyramid_change_detection).
+                               Defaults to CHANGE_DETECTION_COARSE_TO_FINE.
+        return_regions (bool): Also return the REGION_DTYPE change regions.
+        return_diff (bool): Also return the uint8 SSIM diff image (SSIM * 255),
+                            e.g. for the mean SSIM of sub-windows.
+        stats (dict): Optional dict filled with tiling statistics.
+
+    Returns:
+        tuple: (binary_change_mask, ssim_score[, regions][, diff]). The
+               mask and diff are disk-backed np.memmaps.
+    """
+    if memory_budget_mb is None:
+        memory_budget_mb = config.CHANGE_DETECTION_MEMORY_BUDGET_MB
+    workers = workers or config.CHANGE_DETECTION_WORKERS
+    if coarse_to_fine is None:
+        coarse_to_fine = config.CHANGE_DETECTION_COARSE_TO_FINE
+    budget = memory_budget_mb * 1024 * 1024
+    # Every worker holds one window at a time
+    tile_budget = budget // workers
+
+    height, width = _scene_shape(image_path_t0) or (0, 0)
+    if (height, width) != _scene_shape(image_path_t1) or not height:
+        raise ValueError("Streaming change detection needs two readable images of equal size.")
+
+    read_pair = _RasterPairReader(image_path_t0, image_path_t1)
+    spool_dir = tempfile.mkdtemp(prefix="drishti_cd_")
+    # Keep GDAL's block cache inside the budget as well
+    try:
+        with rasterio.Env(GDAL_CACHEMAX=max(budget // 8 // (1024 * 1024), 8)):
+            diff = np.memmap(os.path.join(spool_dir, "diff.u8"), dtype=np.uint8,
+                             mode="w+", shape=(height, width))
+
+            ssim_tile = tile_size_for_budget(tile_budget, _SSIM_BYTES_PER_PIXEL, SSIM_HALO)
+            skip_ssim = skip_mask = None
+            if coarse_to_fine:
+                scale = 2 ** config.PYRAMID_LEVELS
+                coarse_t0, coarse_t1 = (_read_gray_decimated(path, scale) for path in read_pair.paths)
+                flags = _flag_blocks(_coarse_dissimilarity(coarse_t0, coarse_t1, "ssim"), scale,
+                                     (height, width), config.PYRAMID_BLOCK_SIZE,
+                                     config.PYRAMID_SSIM_SCREEN)
+                ssim_tile = min(ssim_tile, config.PYRAMID_BLOCK_SIZE)
+                skip_ssim = lambda tile: not _tile_flagged(flags, config.PYRAMID_BLOCK_SIZE, tile.core)
+                skip_mask = lambda tile: not _tile_flagged(flags, config.PYRAMID_BLOCK_SIZE, tile.window)
+
+            # --- Pass 1: SSIM ---
+            score, threshold, num_tiles, skipped = _tiled_ssim_pass(
+                read_pair, height, width, ssim_tile, diff, workers, skip_tile=skip_ssim)
+            diff.flush()
+            print(f"[ChangeDetection] Streamed SSIM over {num_tiles} tiles: {score:.4f}")
+
+            # --- Pass 2: Threshold, morphology, blob filtering ---
+            if out_path is None:
+                # Removed with the spool dir below; the open mapping keeps the data
+                out_path = os.path.join(spool_dir, "change_mask.npy")
+            final_mask = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.uint8,
+                                                   shape=(height, width))
+            mask_tile = tile_size_for_budget(tile_budget, _MASK_BYTES_PER_PIXEL, MORPH_HALO + AREA_HALO)
+            regions = _tiled_mask_pass(diff, threshold, mask_tile, final_mask, workers,
+                                       skip_tile=skip_mask)
+            final_mask.flush()
+    finally:
+        read_pair.close()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    if stats is not None:
+        stats.update({
+            "ssim_tile_size": ssim_tile,
+            "mask_tile_size": mask_tile,
+            "num_tiles": num_tiles,
+            "workers": workers,
+            "otsu_threshold": threshold,
+            "skipped_fraction": skipped / float(height * width),
+        })
+
+    print(f"[ChangeDetection] Generated streamed mask with {len(regions)} change regions.")
+    return _result(final_mask, score, regions, diff, return_regions, return_diff)
+
+
+def _as_gray(image) -> np.ndarray:
+    if isinstance(image, Scene):
+        return image.gray
+    return image if isinstance(image, np.ndarray) else load_image(image, "gray")
+
+
+def _scene_path(image) -> Optional[str]:
+    """File path behind an image argument, or None for in-memory images."""
+    return image.path if isinstance(image, Scene) else image if isinstance(image, str) else None
+
+
+def _legacy_change_mask(img_t0: np.ndarray, img_t1: np.ndarray) -> np.ndarray:
+    """Thresholded absolute difference with a 3x3 opening (needs a 1px halo)."""
+    # Placeholder logic for demonstration:
+    diff = cv2.absdiff(img_t0, img_t1)
+    
+    # Apply a threshold to get a binary mask
+    _, change_mask = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
+    
+    # Noise reduction (optional but good)
+    return cv2.morphologyEx(change_mask, cv2.MORPH_OPEN, kernel=np.ones((3,3),np.uint8))
+
+
+def detect_changes(image_path_t0, image_path_t1,
+                   coarse_to_fine: bool = None, stats: dict = None) -> np.ndarray:
     """
     Legacy change detection function - kept for backwards compatibility
+
+    Each input is an image path, a Scene, or an already decoded uint8
+    grayscale array (e.g. an upload decoded in memory).
+
+    With coarse_to_fine (default CHANGE_DETECTION_COARSE_TO_FINE) the
+    absolute difference is screened on an image pyramid first and only
+    flagged blocks are differenced at full resolution;
+    stats["skipped_fraction"] reports how much of the scene was skipped.
     """
+    if coarse_to_fine is None:
+        coarse_to_fine = config.CHANGE_DETECTION_COARSE_TO_FINE
     try:
-        img_t0 = cv2.imread(image_path_t0, cv2.IMREAD_GRAYSCALE)
-        img_t1 = cv2.imread(image_path_t1, cv2.IMREAD_GRAYSCALE)
-        
-        if img_t0 is None or img_t1 is None:
-            raise FileNotFoundError("One or both images not found.")
+        img_t0 = _as_gray(image_path_t0)
+        img_t1 = _as_gray(image_path_t1)
 
-        # Placeholder logic for demonstration:
-        diff = cv2.absdiff(img_t0, img_t1)
-        
-        # Apply a threshold to get a binary mask
-        _, change_mask = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
-        
-        # Noise reduction (optional but good)
-        change_mask = cv2.morphologyEx(change_mask, cv2.MORPH_OPEN, kernel=np.ones((3,3),np.uint8))
+        if not coarse_to_fine:
+            change_mask = _legacy_change_mask(img_t0, img_t1)
+        else:
+            block_size = config.PYRAMID_BLOCK_SIZE
+            scale = 2 ** config.PYRAMID_LEVELS
+            coarse_t0 = _build_pyramid_level(img_t0, config.PYRAMID_LEVELS)
+            coarse_t1 = _build_pyramid_level(img_t1, config.PYRAMID_LEVELS)
+            flags = _flag_blocks(_coarse_dissimilarity(coarse_t0, coarse_t1, "absdiff"),
+                                 scale, img_t0.shape, block_size, config.PYRAMID_DIFF_SCREEN)
+
+            change_mask = np.zeros_like(img_t0)
+            processed = 0
+            for tile in iter_tiles(img_t0.shape[0], img_t0.shape[1], block_size, halo=1):
+                if _tile_flagged(flags, block_size, tile.core):
+                    tile_mask = _legacy_change_mask(img_t0[tile.window], img_t1[tile.window])
+                    change_mask[tile.core] = tile_mask[tile.core_in_window]
+                    processed += (tile.row1 - tile.row0) * (tile.col1 - tile.col0)
+
+            skipped_fraction = 1.0 - processed / float(img_t0.size)
+            if stats is not None:
+                stats.update({"block_size": block_size, "flagged_blocks": int(flags.sum()),
+                              "skipped_fraction": skipped_fraction})
+            print(f"[ChangeDetection] Coarse-to-fine: {skipped_fraction:.1%} of pixels skipped.")
         
         print(f"[ChangeDetection] Successfully generated change mask.")
         return change_mask
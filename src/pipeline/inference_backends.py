@@ -0,0 +1,165 @@
+"""
+CPU Inference Backends
+Interchangeable runtimes for the ViT classifier. Every backend takes the
+processor's pixel values (float32, NCHW) and returns logits as a NumPy
+array, so object_detection does not care which one is active:
+
+    eager        PyTorch eager model (the reference)
+    torchscript  traced TorchScript module
+    onnx         ONNX Runtime session
+
+Any backend can use int8 dynamic quantization (Linear weights stored as
+int8, activations quantized on the fly), which is where a ViT spends most
+of its CPU time. TorchScript and ONNX artifacts are exported once and
+cached in INFERENCE_ARTIFACT_DIR under a name that encodes the model,
+runtime and precision; delete the file to force a re-export.
+"""
+
+import os
+import re
+from typing import Callable
+
+import numpy as np
+
+from src import config
+
+BACKENDS = ("eager", "torchscript", "onnx")
+
+
+def artifact_path(model_name: str, backend: str, quantize: bool, ext: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", model_name).strip("-")
+    precision = "int8" if quantize else "fp32"
+    return os.path.join(config.INFERENCE_ARTIFACT_DIR, f"{slug}-{backend}-{precision}.{ext}")
+
+
+def _write_atomically(path: str, write: Callable[[str], None]):
+    """Exports to a temporary file first so no process loads half an artifact."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _logits_module(model):
+    """Wraps a HF classifier so tracing / export sees a tensor -> tensor function."""
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, pixel_values):
+            return self.inner(pixel_values=pixel_values).logits
+
+    return LogitsOnly(model).eval()
+
+
+def _quantize_dynamic(module):
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _set_torch_threads():
+    if config.INFERENCE_THREADS > 0:
+        import torch
+        torch.set_num_threads(config.INFERENCE_THREADS)
+
+
+class EagerBackend:
+    name = "eager"
+
+    def __init__(self, get_model: Callable, quantize: bool = False):
+        _set_torch_threads()
+        _, model = get_model()
+        self.module = _logits_module(model)
+        if quantize:
+            self.module = _quantize_dynamic(self.module)
+
+    def __call__(self, pixel_values: np.ndarray) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            return self.module(torch.from_numpy(pixel_values)).numpy()
+
+
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, get_model: Callable, model_name: str, quantize: bool = False):
+        import torch
+        _set_torch_threads()
+        self.path = artifact_path(model_name, self.name, quantize, "pt")
+        if not os.path.exists(self.path):
+            print(f"[Inference] Exporting TorchScript artifact {self.path}...")
+            module = _logits_module(get_model()[1])
+            if quantize:
+                module = _quantize_dynamic(module)
+            example = torch.zeros(1, 3, 224, 224)
+            with torch.no_grad():
+                traced = torch.jit.trace(module, example)
+            _write_atomically(self.path, lambda p: torch.jit.save(traced, p))
+        self.module = torch.jit.load(self.path).eval()
+
+    def __call__(self, pixel_values: np.ndarray) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            return self.module(torch.from_numpy(pixel_values)).numpy()
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, get_model: Callable, model_name: str, quantize: bool = False):
+        import onnxruntime as ort
+        fp32_path = artifact_path(model_name, self.name, False, "onnx")
+        self.path = artifact_path(model_name, self.name, quantize, "onnx")
+
+        if not os.path.exists(fp32_path):
+            import torch
+            print(f"[Inference] Exporting ONNX artifact {fp32_path}...")
+            module = _logits_module(get_model()[1])
+            example = torch.zeros(1, 3, 224, 224)
+            _write_atomically(fp32_path, lambda p: torch.onnx.export(
+                module, (example,), p, input_names=["pixel_values"], output_names=["logits"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=17))
+        if quantize and not os.path.exists(self.path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            print(f"[Inference] Quantizing ONNX artifact to {self.path}...")
+            _write_atomically(self.path, lambda p: quantize_dynamic(
+                fp32_path, p, weight_type=QuantType.QInt8))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.INFERENCE_THREADS > 0:
+            options.intra_op_num_threads = config.INFERENCE_THREADS
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, pixel_values: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: pixel_values})[0]
+
+
+def create_backend(name: str, get_model: Callable, model_name: str, quantize: bool = False):
+    """
+    Builds the named backend.
+
+    Args:
+        name (str): One of BACKENDS.
+        get_model (callable): Returns (processor, eager model); only called
+                              for eager inference or when an artifact has to
+                              be exported.
+        model_name (str): Hugging Face model id, used in artifact names.
+        quantize (bool): Use int8 dynamic quantization.
+    """
+    if name == "eager":
+        return EagerBackend(get_model, quantize)
+    if name == "torchscript":
+        return TorchScriptBackend(get_model, model_name, quantize)
+    if name == "onnx":
+        return OnnxBackend(get_model, model_name, quantize)
+    raise ValueError(f"Unknown inference backend {name!r}; expected one of {BACKENDS}")
@@ -1,46 +1,208 @@
-import torch
-from transformers import ViTImageProcessor, ViTForImageClassification
+import threading
+from typing import List, Optional
+
+import cv2
+import numpy as np
 from PIL import Image
 
+from src import config
+from src.pipeline.batching import BatchScheduler
+from src.pipeline.inference_backends import create_backend
+from src.pipeline.preprocessing import Scene, TensorSpec, model_tensor
+from src.utils.image_utils import load_image
+from src.utils.metrics import span
+
 # Load a pre-trained model and processor
 # For SIH, you can start with a pre-trained model.
 # For production, this would be fine-tuned on custom satellite data.
-processor = ViTImageProcessor.from_pretrained("google/vit-base-patch16-224")
-model = ViTForImageClassification.from_pretrained("google/vit-base-patch16-224")
+MODEL_NAME = "google/vit-base-patch16-224"
+
+# torch/transformers and the weights are loaded on first use (or by
+# warm_up), so importing this module stays cheap for tooling that never
+# runs inference. Inference goes through the backend selected by
+# config.INFERENCE_BACKEND; the eager model is only loaded when that
+# backend needs it (eager inference, or exporting a missing artifact).
+_processor = None
+_labels = None
+_model = None
+_backend = None
+_load_error = None
+_model_lock = threading.RLock()  # get_backend may call get_model while holding it
+_scheduler = None
+_tensor_spec = None
+
+
+def get_processor():
+    """Returns the image processor, loading it and the class labels on first call."""
+    global _processor, _labels
+    if _processor is None:
+        with _model_lock:
+            if _processor is None:
+                from transformers import AutoConfig, ViTImageProcessor
+                _labels = AutoConfig.from_pretrained(MODEL_NAME).id2label
+                _processor = ViTImageProcessor.from_pretrained(MODEL_NAME)
+    return _processor
+
+
+def get_tensor_spec() -> TensorSpec:
+    """Resize and normalization of model inputs, as configured by the processor."""
+    global _tensor_spec
+    if _tensor_spec is None:
+        _tensor_spec = TensorSpec.from_processor(get_processor())
+    return _tensor_spec
+
+
+def get_model():
+    """
+    Returns (processor, model), loading them on first call.
+
+    Thread-safe: concurrent first callers block on one load.
+    """
+    global _model, _load_error
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                try:
+                    from transformers import ViTForImageClassification
+                    get_processor()
+                    print(f"[ObjectDetection] Loading {MODEL_NAME}...")
+                    model = ViTForImageClassification.from_pretrained(MODEL_NAME)
+                    model.eval()
+                    _model = model
+                    print("[ObjectDetection] Model loaded.")
+                except Exception as e:
+                    _load_error = str(e)
+                    raise
+    return _processor, _model
+
+
+def get_backend():
+    """Returns the configured inference backend, building it on first call."""
+    global _backend, _load_error
+    if _backend is None:
+        with _model_lock:
+            if _backend is None:
+                try:
+                    get_processor()
+                    _backend = create_backend(config.INFERENCE_BACKEND, get_model, MODEL_NAME,
+                                              quantize=config.INFERENCE_QUANTIZE)
+                    _load_error = None
+                    print(f"[ObjectDetection] Using {config.INFERENCE_BACKEND} backend"
+                          f"{' (int8)' if config.INFERENCE_QUANTIZE else ''}.")
+                except Exception as e:
+                    _load_error = str(e)
+                    raise
+    return _backend
+
+
+def is_model_loaded() -> bool:
+    return _backend is not None
+
+
+def model_status() -> dict:
+    """Readiness info for health endpoints."""
+    return {"model": MODEL_NAME, "backend": config.INFERENCE_BACKEND,
+            "quantized": config.INFERENCE_QUANTIZE, "loaded": is_model_loaded(),
+            "error": _load_error}
+
+
+def warm_up(background: bool = False) -> Optional[threading.Thread]:
+    """
+    Loads the model and runs one dummy forward pass so the first real
+    request does not pay for deserialization or kernel initialisation.
+
+    Args:
+        background (bool): Run in a daemon thread and return it.
+    """
+    def _run():
+        try:
+            _infer_batch([np.zeros((224, 224, 3), dtype=np.uint8)])
+            print("[ObjectDetection] Warm-up complete.")
+        except Exception as e:
+            print(f"[Error] Model warm-up failed: {e}")
+
+    if not background:
+        _run()
+        return None
+    thread = threading.Thread(target=_run, name="vit-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _infer_batch(images: List[np.ndarray]) -> List[dict]:
+    """
+    Runs one forward pass over a batch of RGB images.
+
+    Returns one result dict per image, in order.
+    """
+    backend = get_backend()
+
+    # Preprocess the images into one normalized float32 batch
+    pixel_values = model_tensor(images, get_tensor_spec())
+
+    # Perform inference
+    logits = backend(pixel_values)
+
+    # Post-process results
+    # For classification, we get logits that can be converted to probabilities
+    # In a real satellite image detection system, you'd use a detection model
+    # like DETR or a fine-tuned ViT for object detection
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    confidences = (exp / exp.sum(axis=-1, keepdims=True)).max(axis=-1)
+    predicted = logits.argmax(axis=-1)
+
+    # Placeholder for demonstration (simulating detection results)
+    return [{
+        "predicted_class": int(predicted[i]),
+        "confidence": float(confidences[i]),
+        "logits": logits[i:i + 1].tolist(),
+        "bboxes": [[100, 100, 150, 150]]  # Dummy bbox for demo
+    } for i in range(len(images))]
 
-def detect_objects(image_path: str) -> dict:
+
+def get_scheduler() -> BatchScheduler:
+    """Process-wide micro-batching scheduler in front of the model."""
+    global _scheduler
+    if _scheduler is None:
+        with _model_lock:
+            if _scheduler is None:
+                _scheduler = BatchScheduler(_infer_batch,
+                                            max_batch_size=config.INFERENCE_MAX_BATCH_SIZE,
+                                            max_wait_ms=config.INFERENCE_MAX_WAIT_MS,
+                                            name="vit-batcher")
+    return _scheduler
+
+
+def detect_objects(image_path) -> dict:
     """
     Detects objects in a satellite image tile using a Vision Transformer.
+
+    Concurrent calls are micro-batched into one forward pass when
+    config.INFERENCE_BATCHING is enabled.
     
     Args:
-        image_path (str): Path to the image tile (e.g., 512x512).
+        image_path (str | Scene | np.ndarray): Path to the image tile
+                                       (e.g., 512x512), a Scene, or a
+                                       decoded RGB array.
 
     Returns:
         dict: Model outputs including logits and bounding boxes.
     """
     try:
-        image = Image.open(image_path).convert("RGB")
-        
-        # Preprocess the image
-        inputs = processor(images=image, return_tensors="pt")
-        
-        # Perform inference
-        with torch.no_grad():
-            outputs = model(**inputs)
-            
-        # Post-process results
-        # For classification, we get logits that can be converted to probabilities
-        # In a real satellite image detection system, you'd use a detection model
-        # like DETR or a fine-tuned ViT for object detection
-        predicted_class_idx = outputs.logits.argmax(-1).item()
-        
-        # Placeholder for demonstration (simulating detection results)
-        results = {
-            "predicted_class": predicted_class_idx,
-            "confidence": torch.nn.functional.softmax(outputs.logits, dim=-1).max().item(),
-            "logits": outputs.logits.tolist(),
-            "bboxes": [[100, 100, 150, 150]] # Dummy bbox for demo
-        }
+        if isinstance(image_path, np.ndarray):
+            image, image_path = image_path, "in-memory image"
+        elif isinstance(image_path, Scene):
+            image, image_path = image_path.rgb, image_path.name
+        else:
+            # Shared decode: the change-detection stage has usually cached it
+            image = load_image(image_path, "rgb")
+
+        # Timed on the caller's thread so the span reaches its request;
+        # batched calls include the wait for the scheduler
+        with span("inference"):
+            if config.INFERENCE_BATCHING:
+                results = get_scheduler().infer(image)
+            else:
+                results = _infer_batch([image])[0]
         
         print(f"[ObjectDetection] Successfully processed {image_path}")
         return results
@@ -49,6 +211,128 @@ def detect_objects(image_path: str) -> dict:
         print(f"[Error] Object detection failed: {e}")
         return {}
 
+def _infer_many(images: List[np.ndarray]) -> List[dict]:
+    """Runs many images through the model in batches of at most INFERENCE_MAX_BATCH_SIZE."""
+    with span("inference"):
+        if config.INFERENCE_BATCHING:
+            # Through the shared scheduler, so tiles batch with concurrent requests too
+            scheduler = get_scheduler()
+            futures = [scheduler.submit(image) for image in images]
+            return [future.result() for future in futures]
+        step = config.INFERENCE_MAX_BATCH_SIZE
+        results = []
+        for start in range(0, len(images), step):
+            results.extend(_infer_batch(images[start:start + step]))
+        return results
+
+
+def _window_origins(length: int, window: int, stride: int) -> List[int]:
+    """Window starts covering [0, length); the last window is clamped inside."""
+    if length <= window:
+        return [0]
+    origins = list(range(0, length - window, stride))
+    origins.append(length - window)
+    return origins
+
+
+def _changed_windows(change_mask: np.ndarray, window: int, stride: int, min_changed: int):
+    """
+    Yields (row0, col0, changed_pixels) for every window with at least
+    min_changed changed pixels.
+
+    Works one window row at a time from column sums of the strip, so no
+    scene-sized integral image is allocated.
+    """
+    height, width = change_mask.shape
+    col_origins = np.array(_window_origins(width, window, stride))
+    win_w = min(window, width)
+    for row0 in _window_origins(height, window, stride):
+        strip = change_mask[row0:row0 + window]
+        col_counts = np.count_nonzero(strip, axis=0)
+        if not col_counts.any():
+            continue
+        cumulative = np.concatenate(([0], np.cumsum(col_counts)))
+        counts = cumulative[col_origins + win_w] - cumulative[col_origins]
+        for col0, changed in zip(col_origins[counts >= min_changed], counts[counts >= min_changed]):
+            yield row0, int(col0), int(changed)
+
+
+def detect_objects_tiled(image, change_mask: np.ndarray, window: int = None,
+                         stride: int = None, min_changed_pixels: int = None,
+                         stats: dict = None) -> List[dict]:
+    """
+    Classifies window x window tiles of a scene, but only where the change
+    mask says something changed, so the cost follows the amount of change
+    rather than the scene area.
+
+    Args:
+        image (str | Scene | np.ndarray): Path to the "after" image, its
+                                  Scene, or the image already decoded as
+                                  an RGB array.
+        change_mask (np.ndarray): Binary change mask (0 / 255) for the scene.
+                                  Resized (nearest) if its shape differs.
+        window (int): Tile size fed to the model (default DETECTION_WINDOW).
+        stride (int): Tile step (default DETECTION_STRIDE).
+        min_changed_pixels (int): Changed pixels a tile needs to be run.
+        stats (dict): Optional; filled with tile counts.
+
+    Returns:
+        list: One dict per tile run, with "bbox_pixels" ([x1, y1, x2, y2] of
+              the tile's changed pixels) and "window" in scene pixels, plus
+              "class", "predicted_class", "confidence" and "changed_fraction".
+    """
+    window = window or config.DETECTION_WINDOW
+    stride = stride or config.DETECTION_STRIDE
+    if min_changed_pixels is None:
+        min_changed_pixels = config.DETECTION_MIN_CHANGED_PIXELS
+    min_changed_pixels = max(min_changed_pixels, 1)
+
+    try:
+        source = image if isinstance(image, str) else getattr(image, "name", "in-memory image")
+        if isinstance(image, str):
+            image = load_image(image, "rgb")
+        elif isinstance(image, Scene):
+            image = image.rgb
+        height, width = image.shape[:2]
+        if change_mask.shape != (height, width):
+            change_mask = cv2.resize(change_mask, (width, height), interpolation=cv2.INTER_NEAREST)
+
+        tiles, crops = [], []
+        for row0, col0, changed in _changed_windows(change_mask, window, stride, min_changed_pixels):
+            rows = slice(row0, min(row0 + window, height))
+            cols = slice(col0, min(col0 + window, width))
+            tiles.append((rows, cols, changed))
+            crops.append(image[rows, cols])
+
+        total = len(_window_origins(height, window, stride)) * len(_window_origins(width, window, stride))
+        if stats is not None:
+            stats.update({"tiles_total": total, "tiles_run": len(tiles),
+                          "skipped_fraction": 1.0 - len(tiles) / float(total)})
+        if not tiles:
+            return []
+
+        get_processor()
+        id2label = _labels or {}
+        detections = []
+        for (rows, cols, changed), result in zip(tiles, _infer_many(crops)):
+            # Tight box around the changed pixels inside this tile
+            x, y, w, h = cv2.boundingRect(np.ascontiguousarray(change_mask[rows, cols]))
+            detections.append({
+                "bbox_pixels": [cols.start + x, rows.start + y, cols.start + x + w, rows.start + y + h],
+                "window": [cols.start, rows.start, cols.stop, rows.stop],
+                "predicted_class": result["predicted_class"],
+                "class": id2label.get(result["predicted_class"], str(result["predicted_class"])),
+                "confidence": result["confidence"],
+                "changed_fraction": changed / float((rows.stop - rows.start) * (cols.stop - cols.start)),
+            })
+
+        print(f"[ObjectDetection] Tiled detection ran {len(tiles)}/{total} tiles of {source}")
+        return detections
+
+    except Exception as e:
+        print(f"[Error] Tiled object detection failed: {e}")
+        return []
+
 if __name__ == "__main__":
     # Create a dummy image for testing
     img = Image.new('RGB', (224, 224), color = 'blue')
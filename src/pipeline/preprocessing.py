@@ -0,0 +1,141 @@
+"""
+Shared Preprocessing
+Decodes each scene once and derives every representation the pipeline
+stages need from that one buffer: grayscale uint8 for change detection,
+RGB uint8 for detection crops, and normalized float32 tensors for the
+model. Stages receive these arrays instead of file paths, so no stage
+re-reads or re-decodes a scene.
+
+Scenes on disk are decoded through the process-wide image cache, so
+scenes shared by concurrent requests or batched AOIs are decoded once
+per process; every view is also kept on the Scene itself, so a pipeline
+run never decodes twice even if the cache evicts mid-run. All views are
+read-only.
+
+Model tensors are built here instead of by the transformers image
+processor: cv2 resizes each image (area interpolation when shrinking,
+which antialiases like the processor's PIL bilinear resize), and
+rescaling and mean/std normalization are one multiply-add written
+channels-first straight into a preallocated batch buffer.
+"""
+
+import threading
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from src.utils.image_utils import MODES, load_image
+from src.utils.metrics import span
+
+_CONVERSIONS = {"gray": cv2.COLOR_BGR2GRAY, "rgb": cv2.COLOR_BGR2RGB}
+
+
+class Scene:
+    """
+    One scene and its derived views, each computed at most once.
+
+    Built from a path (decoded lazily, so scenes that are only streamed
+    window by window are never decoded whole) or from an already decoded
+    BGR array (e.g. an upload).
+    """
+
+    def __init__(self, path: str = None, bgr: np.ndarray = None, name: str = None):
+        if (path is None) == (bgr is None):
+            raise ValueError("Scene needs exactly one of path or bgr")
+        self.path = path
+        self.name = name or path or "in-memory image"
+        self._views = {}
+        self._lock = threading.Lock()
+        if bgr is not None:
+            bgr = bgr.view()
+            bgr.setflags(write=False)
+            self._views["bgr"] = bgr
+
+    def view(self, mode: str) -> np.ndarray:
+        """The scene as "bgr", "gray" or "rgb" uint8 (read-only)."""
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        with self._lock:
+            image = self._views.get(mode)
+            if image is None:
+                if self.path is not None:
+                    image = load_image(self.path, mode)
+                else:
+                    with span("decode"):
+                        image = cv2.cvtColor(self._views["bgr"], _CONVERSIONS[mode])
+                    image.setflags(write=False)
+                self._views[mode] = image
+        return image
+
+    @property
+    def bgr(self) -> np.ndarray:
+        return self.view("bgr")
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self.view("gray")
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return self.view("rgb")
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(height, width); decodes the scene if it is not decoded yet."""
+        return self.bgr.shape[:2]
+
+
+def load_scenes(*paths: str) -> Tuple[Scene, ...]:
+    """Scenes for image paths, e.g. a (before, after) pair."""
+    return tuple(Scene(path=path) for path in paths)
+
+
+class TensorSpec(NamedTuple):
+    """How images become model input: target size, rescale and normalization."""
+    height: int
+    width: int
+    rescale: float
+    mean: Tuple[float, float, float]
+    std: Tuple[float, float, float]
+
+    @classmethod
+    def from_processor(cls, processor) -> "TensorSpec":
+        """The spec a transformers image processor (e.g. ViTImageProcessor) applies."""
+        size = processor.size
+        height, width = (size["height"], size["width"]) if "height" in size else (size["shortest_edge"],) * 2
+        rescale = processor.rescale_factor if processor.do_rescale else 1.0
+        if processor.do_normalize:
+            mean, std = tuple(processor.image_mean), tuple(processor.image_std)
+        else:
+            mean, std = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+        return cls(height=height, width=width, rescale=rescale, mean=mean, std=std)
+
+
+def model_tensor(images: Sequence[np.ndarray], spec: TensorSpec,
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Normalized float32 (N, 3, height, width) batch from RGB uint8 images.
+
+    Images of any size (e.g. tile views into a scene) are resized to the
+    spec; grayscale images are expanded to three channels. Pass out to
+    reuse a batch buffer of the right shape.
+    """
+    shape = (len(images), 3, spec.height, spec.width)
+    if out is None or out.shape != shape or out.dtype != np.float32:
+        out = np.empty(shape, dtype=np.float32)
+    # (x * rescale - mean) / std as a single multiply-add per pixel
+    std = np.asarray(spec.std, dtype=np.float32).reshape(3, 1, 1)
+    scale = np.float32(spec.rescale) / std
+    offset = -np.asarray(spec.mean, dtype=np.float32).reshape(3, 1, 1) / std
+    for i, image in enumerate(images):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        height, width = image.shape[:2]
+        if (height, width) != (spec.height, spec.width):
+            shrinking = height > spec.height or width > spec.width
+            image = cv2.resize(image, (spec.width, spec.height),
+                               interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        np.multiply(image.transpose(2, 0, 1), scale, out=out[i])
+        out[i] += offset
+    return out
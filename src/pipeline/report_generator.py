@@ -1,76 +1,244 @@
+import asyncio
+import hashlib
 import json
 import os
-from openai import OpenAI # Using OpenAI as an example, can be any LLM
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 
-# It's best practice to load the API key from environment variables
-# client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from src import config
+from src.utils.metrics import timed
 
-def generate_intelligence_summary(report_context: dict, risk_score: float) -> str:
-    """
-    Generates a natural language summary from the richer V2 context.
-
-    Args:
-        report_context (dict): Structured JSON from the API.
-        risk_score (float): The calculated risk score.
+# Reports are generated by ReportClient: an async OpenAI-compatible client
+# with pooled connections, bounded concurrency, per-attempt timeouts and
+# retries, a cache keyed by the canonicalized report context, and the
+# template report as the fallback when no LLM is configured, it fails, or
+# the time budget runs out. Every caller, async handlers and pipeline code
+# on worker threads alike, goes through one background event loop and
+# hence one connection pool.
 
-    Returns:
-        str: A human-readable intelligence report.
-    """
-    
-    # The system prompt sets the LLM's persona
-    system_prompt = f"""
+# The system prompt sets the LLM's persona
+SYSTEM_PROMPT = """
     You are DRISHTI-SHIELD, an AI Intelligence Analyst (Tier 2) for the Indian Armed Forces.
     Your mission is to provide a concise, factual, and actionable summary
     of satellite imagery analysis from a user-defined Area of Interest (AOI).
-    
+
     Input data is a JSON object containing AOI coordinates, a list of detected
     anomalies (fused from ViT and change detection), and a risk score.
-    
+
     Format your response in 3 sections:
     1. **BLUF (Bottom Line Up Front):** A single-sentence summary of the most critical finding.
     2. **Detailed Analysis:** A bulleted list of significant changes, referencing their class.
        Mention the *number* of new anomalies.
     3. **Analyst Recommendation:** A single, actionable recommendation.
-    
+
     Be formal, precise, and use military-style language.
     """
-    
-    # The user prompt contains the data
-    user_prompt = f"Analyze the following data and generate the report:\n\n{json.dumps(report_context, indent=2)}"
 
+
+def canonical_context(report_context: dict, risk_score: float) -> str:
+    """Stable JSON of a report's inputs: key order and float noise do not change it."""
+    def canonical(value):
+        if isinstance(value, dict):
+            return {str(k): canonical(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [canonical(v) for v in value]
+        if hasattr(value, "item"):  # NumPy scalars
+            value = value.item()
+        if isinstance(value, float):
+            return round(value, 6)
+        return value
+
+    return json.dumps({"context": canonical(report_context), "risk_score": canonical(float(risk_score))},
+                      sort_keys=True, separators=(",", ":"), default=str)
+
+
+def template_report(report_context: dict, risk_score: float) -> str:
+    """The report built directly from the context, without an LLM."""
+    # Build a placeholder report from the context
+    num_anomalies = len(report_context.get("detected_anomalies", []))
+    aoi = report_context.get("aoi_coordinates", {})
+
+    bluf = f"**BLUF (Bottom Line Up Front):** AI analysis of AOI [Lat: {aoi.get('south_west',{}).get('lat'):.4f}, Lng: {aoi.get('south_west',{}).get('lng'):.4f}] has identified {num_anomalies} high-confidence anomalies, indicating new activity."
+
+    details = "**Detailed Analysis:**\n"
+    if num_anomalies == 0:
+        details += "* No significant changes or new objects detected in the specified AOI.\n"
+    else:
+        classes = [d.get('class') for d in report_context.get("detected_anomalies")]
+        unique_classes = ", ".join(list(set(classes)))
+        details += f"* A total of {num_anomalies} new anomalies were detected.\n"
+        details += f"* Object classes include: {unique_classes}.\n"
+        details += f"* Structural Similarity Score of {report_context.get('overall_ssim_score', 0):.2f} indicates moderate to high temporal change."
+
+    rec = "**Analyst Recommendation:**\n"
+    if risk_score > 7.0:
+        rec += "* HIGH PRIORITY: Escalate to Tier 3 Analyst for immediate review. Correlate with regional SIGINT."
+    elif risk_score > 4.0:
+        rec += "* MEDIUM PRIORITY: Log detections and schedule for review by regional desk. Monitor AOI for 72 hours."
+    else:
+        rec += "* LOW PRIORITY: Logged. No immediate action required."
+
+    return f"{bluf}\n\n{details}\n\n{rec}"
+
+
+class ReportClient:
+    """
+    Generates reports through an OpenAI-compatible chat endpoint.
+
+    Identical contexts share one cached report, and concurrent requests
+    for the same context wait for a single LLM call. Only LLM reports are
+    cached, so a context whose LLM call failed is retried later; a call
+    that outlives every waiter's budget still fills the cache for the
+    next request.
+    """
+
+    def __init__(self, base_url: str = None, api_key: str = None, model: str = None,
+                 max_connections: int = None, max_concurrency: int = None, timeout_s: float = None,
+                 max_retries: int = None, budget_s: float = None, cache_size: int = None):
+        self.base_url = base_url if base_url is not None else config.LLM_BASE_URL
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self.model = model or config.LLM_MODEL
+        self.max_connections = max_connections or config.LLM_MAX_CONNECTIONS
+        self.max_concurrency = max_concurrency or config.LLM_MAX_CONCURRENCY
+        self.timeout_s = timeout_s if timeout_s is not None else config.LLM_TIMEOUT_S
+        self.max_retries = max_retries if max_retries is not None else config.LLM_MAX_RETRIES
+        self.budget_s = budget_s if budget_s is not None else config.LLM_REPORT_BUDGET_S
+        self.cache_size = cache_size if cache_size is not None else config.REPORT_CACHE_MAX
+        self._cache = OrderedDict()  # key -> report text
+        self._inflight = {}  # key -> asyncio.Future, on the client's loop
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "llm_calls": 0, "fallbacks": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url or self.api_key)
+
+    def _key(self, report_context: dict, risk_score: float) -> str:
+        payload = f"{self.model}\n{canonical_context(report_context, risk_score)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _get_client(self):
+        # Created lazily on the loop that uses it; the pool lives as long as the client
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = AsyncOpenAI(base_url=self.base_url or None, api_key=self.api_key or "unused",
+                                       timeout=self.timeout_s, max_retries=self.max_retries,
+                                       http_client=httpx.AsyncClient(limits=limits, timeout=self.timeout_s))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _call_llm(self, report_context: dict, risk_score: float) -> str:
+        client = self._get_client()
+        # The user prompt contains the data
+        user_prompt = ("Analyze the following data and generate the report:\n\n"
+                       f"{json.dumps(report_context, indent=2, default=str)}")
+        async with self._semaphore:
+            self.stats["llm_calls"] += 1
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "system", "content": SYSTEM_PROMPT},
+                          {"role": "user", "content": user_prompt}])
+        return response.choices[0].message.content
+
+    async def _generate(self, report_context: dict, risk_score: float) -> str:
+        # Runs on the client's own loop, so the cache, in-flight map, pool
+        # and semaphore are only ever touched from one thread
+        key = self._key(report_context, risk_score)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return self._cache[key]
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._call_llm(report_context, risk_score))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda future: self._finish(key, future))
+        try:
+            # shield: one caller running out of budget must not cancel the shared call
+            return await asyncio.wait_for(asyncio.shield(pending), timeout=self.budget_s)
+        except Exception as e:
+            self.stats["fallbacks"] += 1
+            print(f"[LLM] Falling back to template report: {type(e).__name__}: {e}")
+            return template_report(report_context, risk_score)
+
+    def _finish(self, key: str, future: asyncio.Future):
+        # Caches from the call itself, not a waiter, so a report that
+        # arrives after every waiter's budget ran out is not thrown away
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._cache[key] = future.result()
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="report-client",
+                                     daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _submit(self, report_context: dict, risk_score: float) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._generate(report_context, risk_score),
+                                                self._get_loop())
+
+    async def generate(self, report_context: dict, risk_score: float) -> str:
+        """Report for a context: cached, from the LLM within budget_s, or the template."""
+        if not self.enabled:
+            return template_report(report_context, risk_score)
+        return await asyncio.wrap_future(self._submit(report_context, risk_score))
+
+    def generate_sync(self, report_context: dict, risk_score: float) -> str:
+        """generate() for threads without an event loop (e.g. job pool workers)."""
+        if not self.enabled:
+            return template_report(report_context, risk_score)
+        return self._submit(report_context, risk_score).result()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_report_client() -> ReportClient:
+    """The process-wide report client, configured from config on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ReportClient()
+    return _client
+
+
+@timed("report")
+def generate_intelligence_summary(report_context: dict, risk_score: float) -> str:
+    """
+    Generates a natural language summary from the richer V2 context.
+
+    Blocks the calling thread; async code should await
+    get_report_client().generate(...) instead.
+
+    Args:
+        report_context (dict): Structured JSON from the API.
+        risk_score (float): The calculated risk score.
+
+    Returns:
+        str: A human-readable intelligence report.
+    """
     try:
-        # --- SIMULATED LLM CALL ---
-        # In a real app, you'd make the API call here:
-        # response = client.chat.completions.create(...)
-        # return response.choices[0].message.content
-        
-        print("[LLM] Generating simulated report...")
-        
-        # Build a placeholder report from the context
-        num_anomalies = len(report_context.get("detected_anomalies", []))
-        aoi = report_context.get("aoi_coordinates", {})
-        
-        bluf = f"**BLUF (Bottom Line Up Front):** AI analysis of AOI [Lat: {aoi.get('south_west',{}).get('lat'):.4f}, Lng: {aoi.get('south_west',{}).get('lng'):.4f}] has identified {num_anomalies} high-confidence anomalies, indicating new activity."
-
-        details = "**Detailed Analysis:**\n"
-        if num_anomalies == 0:
-            details += "* No significant changes or new objects detected in the specified AOI.\n"
-        else:
-            classes = [d.get('class') for d in report_context.get("detected_anomalies")]
-            unique_classes = ", ".join(list(set(classes)))
-            details += f"* A total of {num_anomalies} new anomalies were detected.\n"
-            details += f"* Object classes include: {unique_classes}.\n"
-            details += f"* Structural Similarity Score of {report_context.get('overall_ssim_score', 0):.2f} indicates moderate to high temporal change."
-
-        rec = "**Analyst Recommendation:**\n"
-        if risk_score > 7.0:
-            rec += "* HIGH PRIORITY: Escalate to Tier 3 Analyst for immediate review. Correlate with regional SIGINT."
-        elif risk_score > 4.0:
-            rec += "* MEDIUM PRIORITY: Log detections and schedule for review by regional desk. Monitor AOI for 72 hours."
-        else:
-            rec += "* LOW PRIORITY: Logged. No immediate action required."
-
-        return f"{bluf}\n\n{details}\n\n{rec}"
+        if not get_report_client().enabled:
+            print("[LLM] Generating simulated report...")
+        return get_report_client().generate_sync(report_context, risk_score)
 
     except Exception as e:
         print(f"[Error] LLM report generation failed: {e}")
@@ -83,7 +251,7 @@ if __name__ == "__main__":
         {"type": "structure_change", "class": "building", "area_sq_m": 500, "location": "Sector 4B"},
     ]
     mock_risk_score = 9.2
-    
+
     report = generate_intelligence_summary(mock_fused_data, mock_risk_score)
     print("\n--- GENERATED INTELLIGENCE REPORT ---")
     print(report)
@@ -0,0 +1,99 @@
+"""
+Tiling Helpers
+Splits large scenes into overlapping windows so pipeline stages can run
+on one tile at a time and stitch the cores back together seamlessly.
+"""
+
+import math
+from typing import Iterator, NamedTuple
+
+
+class Tile(NamedTuple):
+    """
+    One tile of a scene.
+
+    The *core* is the part of the scene this tile is responsible for.
+    The *window* is the core grown by a halo (clamped to the scene) and is
+    what actually gets read and processed, so that neighbourhood
+    operations near the core edges see real pixels instead of padding.
+    """
+    row0: int  # core, scene coordinates (half-open)
+    col0: int
+    row1: int
+    col1: int
+    win_row0: int  # window, scene coordinates (half-open)
+    win_col0: int
+    win_row1: int
+    win_col1: int
+
+    @property
+    def window_shape(self):
+        return (self.win_row1 - self.win_row0, self.win_col1 - self.win_col0)
+
+    @property
+    def core_in_window(self):
+        """Slices selecting the core out of an array covering the window."""
+        return (
+            slice(self.row0 - self.win_row0, self.row1 - self.win_row0),
+            slice(self.col0 - self.win_col0, self.col1 - self.win_col0),
+        )
+
+    @property
+    def core(self):
+        """Slices selecting the core out of a scene-sized array."""
+        return (slice(self.row0, self.row1), slice(self.col0, self.col1))
+
+    @property
+    def window(self):
+        """Slices selecting the window out of a scene-sized array."""
+        return (slice(self.win_row0, self.win_row1), slice(self.win_col0, self.win_col1))
+
+
+def iter_tiles(height: int, width: int, tile_size: int, halo: int = 0) -> Iterator[Tile]:
+    """
+    Yields tiles covering a (height, width) scene in row-major order.
+
+    Args:
+        height (int): Scene height in pixels.
+        width (int): Scene width in pixels.
+        tile_size (int): Side length of each tile core.
+        halo (int): Extra context pixels read around each core.
+    """
+    if tile_size <= 0:
+        raise ValueError("tile_size must be positive")
+
+    rows = _spans(height, tile_size, halo)
+    cols = _spans(width, tile_size, halo)
+    for row0, row1 in rows:
+        for col0, col1 in cols:
+            yield Tile(
+                row0, col0, row1, col1,
+                max(row0 - halo, 0), max(col0 - halo, 0),
+                min(row1 + halo, height), min(col1 + halo, width),
+            )
+
+
+def _spans(length: int, tile_size: int, halo: int):
+    """(start, stop) core spans along one axis."""
+    starts = list(range(0, length, tile_size))
+    # Fold a trailing sliver into the previous tile so no window ends up
+    # narrower than the neighbourhood operations running on it
+    if len(starts) > 1 and length - starts[-1] <= halo:
+        starts.pop()
+    return list(zip(starts, starts[1:] + [length]))
+
+
+def tile_size_for_budget(budget_bytes: int, bytes_per_pixel: float, halo: int,
+                         min_tile: int = 256) -> int:
+    """
+    Largest tile core whose window (core + 2 * halo per side) fits the budget.
+
+    Args:
+        budget_bytes (int): Working-memory budget for one tile.
+        bytes_per_pixel (float): Estimated peak bytes per window pixel.
+        halo (int): Halo width in pixels.
+        min_tile (int): Floor for the core size, so tiny budgets still
+                        make progress instead of degenerating into slivers.
+    """
+    window_side = int(math.sqrt(budget_bytes / bytes_per_pixel))
+    return max(window_side - 2 * halo, min_tile)
@@ -0,0 +1,169 @@
+"""
+Incremental Time-Series Change Detection
+Keeps a per-pixel statistical baseline for every monitored AOI and tests
+each new acquisition against it, so the acquisition history never has to
+be re-read or re-compared.
+
+For each AOI the baseline is an exponentially weighted mean and variance
+of the grayscale image, stored as two float32 .npy arrays (8 bytes per
+pixel) next to a small JSON metadata file:
+
+    <TIMESERIES_DIR>/<aoi_id>/mean.npy
+    <TIMESERIES_DIR>/<aoi_id>/var.npy
+    <TIMESERIES_DIR>/<aoi_id>/meta.json
+
+An update touches every pixel once (O(pixels)) and works through the
+memory-mapped arrays in row strips, so RAM use is bounded by the strip
+size plus one uint8 mask, not by the history length.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src import config
+from src.pipeline.change_detection import MIN_CHANGE_AREA, MORPH_ITERATIONS, MORPH_KERNEL
+from src.pipeline.regions import empty_regions, extract_change_regions
+
+_AOI_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# One lock per AOI so concurrent acquisitions for the same AOI apply in order
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _aoi_lock(aoi_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(aoi_id, threading.Lock())
+
+
+class AoiBaseline:
+    """
+    Per-pixel running baseline for one AOI.
+
+    The first acquisitions are averaged with equal weight (weight 1/n)
+    until n reaches 1/alpha, after which the baseline becomes an
+    exponentially weighted moving average with weight alpha, so it follows
+    slow seasonal drift but not one-off changes.
+    """
+
+    def __init__(self, aoi_id: str, root: str = None, alpha: float = None,
+                 z_threshold: float = None, min_observations: int = None):
+        if not _AOI_ID_PATTERN.match(aoi_id):
+            raise ValueError("aoi_id must be 1-64 characters of letters, digits, '_' or '-'.")
+        self.aoi_id = aoi_id
+        self.path = os.path.join(root or config.TIMESERIES_DIR, aoi_id)
+        self.alpha = alpha if alpha is not None else config.TIMESERIES_ALPHA
+        self.z_threshold = z_threshold if z_threshold is not None else config.TIMESERIES_Z_THRESHOLD
+        self.min_observations = (min_observations if min_observations is not None
+                                 else config.TIMESERIES_MIN_OBSERVATIONS)
+
+    # --- Storage ---
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self._meta_path)
+
+    def metadata(self) -> dict:
+        with open(self._meta_path) as f:
+            return json.load(f)
+
+    def _write_metadata(self, meta: dict):
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _open_arrays(self, shape: Tuple[int, int], create: bool):
+        mode = "w+" if create else "r+"
+        mean = np.lib.format.open_memmap(os.path.join(self.path, "mean.npy"), mode=mode,
+                                         dtype=np.float32, shape=shape if create else None)
+        var = np.lib.format.open_memmap(os.path.join(self.path, "var.npy"), mode=mode,
+                                        dtype=np.float32, shape=shape if create else None)
+        return mean, var
+
+    # --- Update ---
+
+    def update(self, gray: np.ndarray, acquired_at: Optional[float] = None):
+        """
+        Tests one acquisition against the baseline, then folds it in.
+
+        Args:
+            gray (np.ndarray): uint8 grayscale acquisition. Resized to the
+                               baseline's shape if it differs.
+            acquired_at (float): Acquisition time (UNIX seconds); defaults
+                                 to now.
+
+        Returns:
+            tuple: (change_mask, regions, meta). The mask is empty until the
+                   baseline has min_observations acquisitions.
+        """
+        with _aoi_lock(self.aoi_id):
+            os.makedirs(self.path, exist_ok=True)
+            create = not self.exists()
+            if create:
+                shape = gray.shape
+                meta = {"aoi_id": self.aoi_id, "shape": list(shape), "count": 0,
+                        "alpha": self.alpha, "created_at": time.time()}
+            else:
+                meta = self.metadata()
+                shape = tuple(meta["shape"])
+                if gray.shape != shape:
+                    gray = cv2.resize(gray, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+
+            mean, var = self._open_arrays(shape, create)
+            count = meta["count"]
+            test = count >= self.min_observations
+            # Equal weights while warming up, then a fixed EWMA weight
+            weight = max(1.0 / (count + 1), self.alpha)
+            min_var = config.TIMESERIES_MIN_STD ** 2
+            z2 = self.z_threshold ** 2
+
+            raw_mask = np.zeros(shape, dtype=np.uint8)
+            strip = max(config.TIMESERIES_STRIP_ROWS, 1)
+            for row0 in range(0, shape[0], strip):
+                rows = slice(row0, min(row0 + strip, shape[0]))
+                x = gray[rows].astype(np.float32)
+                m = mean[rows]
+                v = var[rows]
+                delta = x - m
+                if test:
+                    # |x - mean| > z * std, without a square root
+                    raw_mask[rows] = (delta * delta > z2 * np.maximum(v, min_var)) * np.uint8(255)
+                if count == 0:
+                    m[:] = x
+                    v[:] = 0.0
+                else:
+                    # West's incremental weighted mean / variance
+                    increment = weight * delta
+                    m += increment
+                    v[:] = (1.0 - weight) * (v + delta * increment)
+            mean.flush()
+            var.flush()
+            del mean, var
+
+            meta["count"] = count + 1
+            meta["updated_at"] = time.time()
+            meta["last_acquired_at"] = acquired_at if acquired_at is not None else meta["updated_at"]
+
+            if test:
+                mask = cv2.morphologyEx(raw_mask, cv2.MORPH_OPEN, MORPH_KERNEL, iterations=MORPH_ITERATIONS)
+                mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, MORPH_KERNEL, iterations=MORPH_ITERATIONS)
+                change_mask, regions = extract_change_regions(mask, min_area=MIN_CHANGE_AREA)
+            else:
+                change_mask, regions = raw_mask, empty_regions()
+            meta["last_changed_fraction"] = float(np.count_nonzero(change_mask)) / change_mask.size
+            self._write_metadata(meta)
+
+        print(f"[TimeSeries] AOI {self.aoi_id}: observation {meta['count']}, "
+              f"{len(regions)} change regions.")
+        return change_mask, regions, meta
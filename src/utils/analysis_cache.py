@@ -0,0 +1,93 @@
+"""
+AOI Analysis Cache
+Keeps finished AOI analyses so near-identical resubmissions (the same
+rectangle redrawn on the map) are answered without re-running the
+pipeline.
+
+Keys combine the AOI bounds snapped outward to a grid of grid_deg
+degrees with the versions of the source imagery (path, mtime, size) and
+of the models, so new imagery or a model change is never served a stale
+result. Each key has an ETag (its SHA-256) for If-None-Match / 304.
+Entries expire after ttl_s seconds and the least recently used ones are
+evicted beyond max_entries.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from src import config
+
+
+def snap_bounds(aoi_bounds: dict, grid_deg: float) -> dict:
+    """Grows bounds outward to the nearest grid_deg cell edges."""
+    if grid_deg <= 0:
+        return aoi_bounds
+
+    def snap(value, round_fn):
+        # round() first so 28.7 / 0.1 == 286.99999 still lands on its edge
+        return round(round_fn(round(value / grid_deg, 9)) * grid_deg, 9)
+
+    return {
+        "north_east": {"lat": snap(aoi_bounds["north_east"]["lat"], math.ceil),
+                       "lng": snap(aoi_bounds["north_east"]["lng"], math.ceil)},
+        "south_west": {"lat": snap(aoi_bounds["south_west"]["lat"], math.floor),
+                       "lng": snap(aoi_bounds["south_west"]["lng"], math.floor)},
+    }
+
+
+def file_version(path: str) -> list:
+    """Identity of an imagery file that changes whenever it is rewritten."""
+    st = os.stat(path)
+    return [os.path.realpath(path), st.st_mtime_ns, st.st_size]
+
+
+class AnalysisCache:
+    def __init__(self, max_entries: int, ttl_s: float, grid_deg: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.grid_deg = grid_deg
+        self._entries = OrderedDict()  # etag -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, snapped_bounds: dict, imagery: Iterable[str], model: dict) -> str:
+        """Cache key (and ETag) for an analysis of already snapped bounds."""
+        key = {"bounds": snapped_bounds, "imagery": [file_version(p) for p in imagery],
+               "model": model}
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def get(self, etag: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[etag]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, etag: str, value: Any):
+        with self._lock:
+            self._entries[etag] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+default_cache = AnalysisCache(config.AOI_CACHE_MAX_ENTRIES, config.AOI_CACHE_TTL_S,
+                              config.AOI_CACHE_GRID_DEG)
@@ -0,0 +1,256 @@
+"""
+Persistent Anomaly Store
+Records every fused anomaly an analysis produces in SQLite so later
+questions like "what changed inside this rectangle last month" are
+answered from the store instead of by re-running analyses.
+
+Each anomaly keeps its geographic bbox (lng/lat), class, type,
+confidence, changed fraction, the analysis' SSIM and risk score and when
+it was observed, so its risk can be re-scored later with new weights.
+Every recorded analysis also gets one row of its own (SSIM, risk score,
+time), so analyses that produced no anomalies are re-scored too. A 3-D
+SQLite R-tree over (lng, lat, time) indexes them, so bbox + time-range
+queries only visit candidate rows; R-tree coordinates are float32 and
+rounded outward, so candidates are re-checked against the exact values.
+
+Connections are per thread and the database runs in WAL mode, so job
+workers can write while API requests read. Ids are assigned by SQLite
+inside BEGIN IMMEDIATE transactions, so several processes (e.g. uvicorn
+workers and a backfill script) can write to the same file.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from src import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomalies (
+    id INTEGER PRIMARY KEY,
+    analysis_id TEXT,
+    observed_at REAL NOT NULL,
+    class TEXT,
+    type TEXT,
+    confidence REAL,
+    risk_score REAL,
+    changed_fraction REAL,
+    ssim_score REAL,
+    min_lng REAL NOT NULL, min_lat REAL NOT NULL,
+    max_lng REAL NOT NULL, max_lat REAL NOT NULL,
+    properties TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS anomaly_index USING rtree(
+    id, min_lng, max_lng, min_lat, max_lat, min_t, max_t
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    analysis_id TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    ssim_score REAL,
+    risk_score REAL,
+    anomaly_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS analyses_observed ON analyses (observed_at);
+CREATE INDEX IF NOT EXISTS analyses_analysis ON analyses (analysis_id);
+"""
+
+_COLUMNS = ("id", "analysis_id", "observed_at", "class", "type", "confidence", "risk_score",
+            "changed_fraction", "ssim_score", "min_lng", "min_lat", "max_lng", "max_lat", "properties")
+# Columns added after the first release; older databases are migrated on open
+_ADDED_COLUMNS = {"changed_fraction": "REAL", "ssim_score": "REAL"}
+
+
+class AnomalyStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(anomalies)")}
+            for name, sql_type in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE anomalies ADD COLUMN {name} {sql_type}")
+            # Re-scoring writes back per analysis
+            conn.execute("CREATE INDEX IF NOT EXISTS anomalies_analysis ON anomalies (analysis_id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, anomalies: Iterable[dict], analysis_id: str = None, risk_score: float = None,
+            observed_at: float = None, ssim_score: float = None) -> int:
+        """
+        Records anomalies in one transaction and returns how many were added.
+
+        Each anomaly needs "bbox" ([min_lng, min_lat, max_lng, max_lat]);
+        "class", "type", "confidence" and "changed_fraction" are stored as
+        columns and the whole dict as JSON properties. With analysis_id the
+        analysis itself is recorded as well, even if anomalies is empty.
+        """
+        observed_at = time.time() if observed_at is None else observed_at
+        rows = []
+        for item in anomalies:
+            min_lng, min_lat, max_lng, max_lat = item["bbox"]
+            rows.append((analysis_id, observed_at, item.get("class"), item.get("type"),
+                         item.get("confidence"), risk_score, item.get("changed_fraction"),
+                         ssim_score, min_lng, min_lat, max_lng, max_lat,
+                         json.dumps(item, default=str)))
+        if not rows and analysis_id is None:
+            return 0
+
+        insert = (f"INSERT INTO anomalies ({', '.join(_COLUMNS[1:])}) "
+                  f"VALUES ({', '.join('?' * (len(_COLUMNS) - 1))})")
+        conn = self._conn()
+        with self._write_lock:
+            # SQLite assigns the ids; IMMEDIATE takes the write lock up front,
+            # so other processes writing the same file wait instead of colliding
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [conn.execute(insert, row).lastrowid for row in rows]
+                conn.executemany("INSERT INTO anomaly_index VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 [(i, r[8], r[10], r[9], r[11], r[1], r[1]) for i, r in zip(ids, rows)])
+                if analysis_id is not None:
+                    conn.execute("INSERT INTO analyses (analysis_id, observed_at, ssim_score, "
+                                 "risk_score, anomaly_count) VALUES (?, ?, ?, ?, ?)",
+                                 (analysis_id, observed_at, ssim_score, risk_score, len(rows)))
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        return len(rows)
+
+    def query(self, min_lng: float, min_lat: float, max_lng: float, max_lat: float,
+              since: float = None, until: float = None, classes: Optional[List[str]] = None,
+              limit: int = 1000) -> List[dict]:
+        """
+        Anomalies whose bbox intersects the given bbox, observed within
+        [since, until] (either end optional), newest first.
+        """
+        where = ["i.max_lng >= ?", "i.min_lng <= ?", "i.max_lat >= ?", "i.min_lat <= ?",
+                 "a.max_lng >= ?", "a.min_lng <= ?", "a.max_lat >= ?", "a.min_lat <= ?"]
+        params = [min_lng, max_lng, min_lat, max_lat] * 2
+        if since is not None:
+            where += ["i.max_t >= ?", "a.observed_at >= ?"]
+            params += [since, since]
+        if until is not None:
+            where += ["i.min_t <= ?", "a.observed_at <= ?"]
+            params += [until, until]
+        if classes:
+            where.append(f"a.class IN ({', '.join('?' * len(classes))})")
+            params += list(classes)
+
+        sql = (f"SELECT {', '.join('a.' + c for c in _COLUMNS)} "
+               f"FROM anomaly_index i JOIN anomalies a ON a.id = i.id "
+               f"WHERE {' AND '.join(where)} ORDER BY a.observed_at DESC LIMIT ?")
+        rows = self._conn().execute(sql, (*params, int(limit))).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def scoring_columns(self, since: float = None, until: float = None) -> dict:
+        """
+        The risk-scoring inputs of every anomaly observed within
+        [since, until] as NumPy columns: analysis_id, class, confidence,
+        changed_fraction and ssim_score (NaN where unknown).
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("observed_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("observed_at <= ?")
+            params.append(until)
+        sql = ("SELECT COALESCE(analysis_id, ''), COALESCE(class, ''), confidence, "
+               "changed_fraction, ssim_score FROM anomalies"
+               + (f" WHERE {' AND '.join(where)}" if where else ""))
+        rows = self._conn().execute(sql, params).fetchall()
+        names = ("analysis_id", "class", "confidence", "changed_fraction", "ssim_score")
+        if not rows:
+            return {name: np.zeros(0) for name in names}
+        columns = list(zip(*rows))
+        return {
+            "analysis_id": np.array(columns[0], dtype=object),
+            "class": np.array(columns[1], dtype=object),
+            **{name: np.array(col, dtype=np.float64) for name, col in zip(names[2:], columns[2:])},
+        }
+
+    def analysis_columns(self, since: float = None, until: float = None) -> dict:
+        """
+        analysis_id and ssim_score (NaN where unknown) of every analysis
+        recorded within [since, until], with or without anomalies.
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("observed_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("observed_at <= ?")
+            params.append(until)
+        sql = ("SELECT analysis_id, ssim_score FROM analyses"
+               + (f" WHERE {' AND '.join(where)}" if where else ""))
+        rows = self._conn().execute(sql, params).fetchall()
+        ids, ssim = zip(*rows) if rows else ((), ())
+        return {"analysis_id": np.array(ids, dtype=object),
+                "ssim_score": np.array(ssim, dtype=np.float64)}
+
+    def set_risk_scores(self, analysis_ids, risk_scores) -> int:
+        """
+        Writes re-scored risk back to each analysis and every one of its
+        anomalies; returns how many anomalies were updated.
+        """
+        params = [(float(r), str(a)) for a, r in zip(analysis_ids, risk_scores)]
+        conn = self._conn()
+        with self._write_lock, conn:
+            cursor = conn.executemany("UPDATE anomalies SET risk_score = ? WHERE analysis_id = ?", params)
+            conn.executemany("UPDATE analyses SET risk_score = ? WHERE analysis_id = ?", params)
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM anomalies").fetchone()[0]
+
+
+def to_geojson(records: List[dict]) -> dict:
+    """FeatureCollection of stored anomalies as points at their bbox centres."""
+    features = []
+    for r in records:
+        features.append({
+            "type": "Feature",
+            "bbox": [r["min_lng"], r["min_lat"], r["max_lng"], r["max_lat"]],
+            "geometry": {
+                "type": "Point",
+                "coordinates": [(r["min_lng"] + r["max_lng"]) / 2, (r["min_lat"] + r["max_lat"]) / 2]
+            },
+            "properties": {
+                "id": r["id"], "analysis_id": r["analysis_id"], "observed_at": r["observed_at"],
+                "class": r["class"], "type": r["type"], "confidence": r["confidence"],
+                "risk_score": r["risk_score"]
+            }
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> AnomalyStore:
+    """The process-wide store at ANOMALY_DB_PATH, opened on first use."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = AnomalyStore(config.ANOMALY_DB_PATH)
+    return _default
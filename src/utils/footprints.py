@@ -0,0 +1,117 @@
+"""
+Change Footprints
+Polygonizes an analysis' change mask into GeoJSON polygons, simplified
+per level of detail (config.FOOTPRINT_LODS), so clients can draw change
+outlines as vectors and ask for coarse outlines when zoomed out instead
+of downloading rasters.
+
+The mask is polygonized once per analysis (rasterio.features.shapes, in
+pixel space); each LOD is simplified with shapely's topology-preserving
+simplify at its pixel tolerance, projected with the analysis' affine
+transform and cached as ready-to-send GeoJSON.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from rasterio.features import shapes
+from shapely.affinity import affine_transform
+from shapely.geometry import mapping, shape
+
+from src import config
+from src.utils.geo_utils import bounds_transform
+from src.utils.mask_tiles import default_tiles
+
+# Coordinates are rounded to this many decimals (~1 cm at the equator)
+COORD_DECIMALS = 7
+
+
+def polygonize_mask(mask: np.ndarray) -> list:
+    """Shapely polygons (pixel coordinates) of the changed areas of a 0/255 mask."""
+    binary = np.ascontiguousarray(mask > 0, dtype=np.uint8)
+    return [shape(geom) for geom, _ in shapes(binary, mask=binary.astype(bool), connectivity=8)]
+
+
+def _round_coords(coords):
+    if isinstance(coords[0], (int, float)):
+        return [round(c, COORD_DECIMALS) for c in coords]
+    return [_round_coords(c) for c in coords]
+
+
+def footprint_geojson(polygons: list, bounds: dict, image_dims: tuple, tolerance: float,
+                      lod: str = None) -> dict:
+    """FeatureCollection of polygons simplified at tolerance (pixels) and projected to lng/lat."""
+    t = bounds_transform(bounds, image_dims)
+    matrix = [t.a, t.b, t.d, t.e, t.c, t.f]
+    features = []
+    for polygon in polygons:
+        simplified = polygon.simplify(tolerance, preserve_topology=True) if tolerance > 0 else polygon
+        if simplified.is_empty:
+            continue
+        geometry = mapping(affine_transform(simplified, matrix))
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": geometry["type"], "coordinates": _round_coords(geometry["coordinates"])},
+            "properties": {"area_pixels": float(polygon.area)},
+        })
+    return {"type": "FeatureCollection", "features": features,
+            "properties": {"lod": lod, "tolerance_pixels": tolerance}}
+
+
+class FootprintCache:
+    """
+    Per-analysis polygons and per-LOD GeoJSON, LRU-bounded by analysis.
+
+    get_mask(analysis_id) supplies (mask, bounds) for analyses not yet
+    polygonized (e.g. MaskTileServer.mask).
+    """
+
+    def __init__(self, get_mask: Callable, max_analyses: int, lods: dict):
+        self.get_mask = get_mask
+        self.max_analyses = max_analyses
+        self.lods = lods
+        self._entries = OrderedDict()  # analysis_id -> {"polygons", "bounds", "dims", "lods"}
+        self._lock = threading.Lock()
+
+    def _entry(self, analysis_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is not None:
+                self._entries.move_to_end(analysis_id)
+                return entry
+        source = self.get_mask(analysis_id)
+        if source is None:
+            return None
+        mask, bounds = source
+        entry = {"polygons": polygonize_mask(mask), "bounds": bounds,
+                 "dims": mask.shape[:2], "lods": {}}
+        with self._lock:
+            # A concurrent caller may have polygonized it first; keep theirs
+            entry = self._entries.setdefault(analysis_id, entry)
+            while len(self._entries) > self.max_analyses:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get(self, analysis_id: str, lod: str) -> Optional[dict]:
+        """
+        GeoJSON footprint of an analysis at a named LOD, or None if the
+        analysis is unknown or evicted.
+
+        Raises:
+            KeyError: If lod is not configured.
+        """
+        tolerance = self.lods[lod]
+        entry = self._entry(analysis_id)
+        if entry is None:
+            return None
+        geojson = entry["lods"].get(lod)
+        if geojson is None:
+            geojson = footprint_geojson(entry["polygons"], entry["bounds"], entry["dims"],
+                                        tolerance, lod)
+            entry["lods"][lod] = geojson
+        return geojson
+
+
+default_footprints = FootprintCache(default_tiles.mask, config.FOOTPRINT_CACHE_MAX, config.FOOTPRINT_LODS)
@@ -1,73 +1,98 @@
+import numpy as np
 import rasterio
-from rasterio.transform import Affine
+from rasterio.transform import Affine, from_bounds
 
-def convert_pixels_to_geojson(pixel_data: list, aoi_bounds: dict, image_dims: tuple):
+from src.utils.metrics import timed
+
+
+def bounds_transform(aoi_bounds: dict, image_dims: tuple) -> Affine:
+    """
+    Affine transform mapping (col, row) pixels of an image to (lng, lat)
+    for an image that exactly covers aoi_bounds.
+
+    Row 0 is the northern edge, so latitude decreases down the image.
+
+    Args:
+        aoi_bounds (dict): {"north_east": {"lat", "lng"}, "south_west": {"lat", "lng"}}
+        image_dims (tuple): The (height, width) of the image.
+    """
+    height, width = image_dims
+    return from_bounds(aoi_bounds["south_west"]["lng"], aoi_bounds["south_west"]["lat"],
+                       aoi_bounds["north_east"]["lng"], aoi_bounds["north_east"]["lat"],
+                       width, height)
+
+
+def image_transform(image_path: str) -> Affine:
+    """Geotransform of a GeoTIFF (pixel -> CRS coordinates, lng/lat for EPSG:4326)."""
+    with rasterio.open(image_path) as src:
+        return src.transform
+
+
+def pixels_to_geo(transform: Affine, xs, ys) -> np.ndarray:
+    """
+    Projects arrays of pixel coordinates in one call.
+
+    Args:
+        transform (Affine): Pixel -> geo transform.
+        xs, ys (array-like): Pixel columns and rows (same shape).
+
+    Returns:
+        np.ndarray: (..., 2) array of [lng, lat] pairs.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    a, b, c, d, e, f = transform[:6]
+    return np.stack([a * xs + b * ys + c, d * xs + e * ys + f], axis=-1)
+
+
+def bbox_centers_to_geo(transform: Affine, bboxes) -> np.ndarray:
+    """Projects the centres of an (N, 4) array of [x1, y1, x2, y2] boxes to (N, 2) [lng, lat]."""
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return pixels_to_geo(transform, (bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2)
+
+
+def _point_features(items: list, transform: Affine, properties) -> list:
+    """Point features at the bbox centre of every item that has a bbox_pixels."""
+    items = [item for item in items if "bbox_pixels" in item]
+    if not items:
+        return []
+    centers = bbox_centers_to_geo(transform, [item["bbox_pixels"] for item in items]).tolist()
+    return [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": center  # GeoJSON is [Lng, Lat]
+            },
+            "properties": properties(item)
+        }
+        for item, center in zip(items, centers)
+    ]
+
+
+@timed("geojson")
+def convert_pixels_to_geojson(pixel_data: list, aoi_bounds: dict, image_dims: tuple,
+                              transform: Affine = None):
     """
     Converts a list of pixel-based detections into a GeoJSON FeatureCollection.
-    
+
     Args:
         pixel_data (list): List of detection dicts, e.g.,
                            [{"bbox_pixels": [x1, y1, x2, y2], ...}]
         aoi_bounds (dict): The Lat/Lng bounds from the frontend, e.g.,
                            {"north_east": {"lat": y, "lng": x}, "south_west": ...}
         image_dims (tuple): The (height, width) of the image processed.
+        transform (Affine): Optional real geotransform (e.g. from
+                            image_transform); overrides aoi_bounds/image_dims.
     """
-    
-    img_height, img_width = image_dims
-    
-    # Get the corners from the AOI
-    min_lng = aoi_bounds["south_west"]["lng"]
-    min_lat = aoi_bounds["south_west"]["lat"]
-    max_lng = aoi_bounds["north_east"]["lng"]
-    max_lat = aoi_bounds["north_east"]["lat"]
-    
-    # Calculate the total geographic span
-    span_lng = max_lng - min_lng
-    span_lat = max_lat - min_lat
-    
-    def pixel_to_geo(px, py):
-        """
-        Maps a single (x, y) pixel coordinate to a (lng, lat) coordinate.
-        """
-        # Calculate percentage of pixel across the image
-        percent_x = px / img_width
-        percent_y = py / img_height
-        
-        # Apply that percentage to the geographic span
-        # Note: Latitude (Y) is inverted. 0px is max_lat, img_height is min_lat.
-        lng = min_lng + (percent_x * span_lng)
-        lat = max_lat - (percent_y * span_lat)
-        
-        return [lng, lat]
-
-    features = []
-    for item in pixel_data:
-        if "bbox_pixels" not in item:
-            continue
-            
-        x1, y1, x2, y2 = item["bbox_pixels"]
-        
-        # Get center of the box
-        center_x_pixel = (x1 + x2) / 2
-        center_y_pixel = (y1 + y2) / 2
-        
-        # Convert center pixel to geo coordinate
-        [lng, lat] = pixel_to_geo(center_x_pixel, center_y_pixel)
-        
-        # Create a GeoJSON Feature
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [lng, lat]  # GeoJSON is [Lng, Lat]
-            },
-            "properties": {
-                "type": item.get("type", "Unknown"),
-                "class": item.get("class", "Unknown"),
-                "confidence": item.get("confidence", 0.0)
-            }
-        }
-        features.append(feature)
+    if transform is None:
+        transform = bounds_transform(aoi_bounds, image_dims)
+
+    features = _point_features(pixel_data, transform, lambda item: {
+        "type": item.get("type", "Unknown"),
+        "class": item.get("class", "Unknown"),
+        "confidence": item.get("confidence", 0.0)
+    })
 
     # Wrap all features in a FeatureCollection
     return {
@@ -76,59 +101,27 @@ def convert_pixels_to_geojson(pixel_data: list, aoi_bounds: dict, image_dims: tu
     }
 
 
-def convert_to_geojson(fused_data, image_bounds_latlng):
+@timed("geojson")
+def convert_to_geojson(fused_data, image_bounds_latlng, image_dims: tuple = (1024, 1024),
+                       transform: Affine = None):
     """
     Converts pixel-based fused data to a GeoJSON FeatureCollection.
 
-    In a REAL system, you'd use rasterio to read the GeoTIFF transform.
-    For SIH, we can *simulate* this by creating a simple
-    linear transformation from the known image_bounds.
+    In a REAL system, you'd use rasterio to read the GeoTIFF transform
+    (pass it as transform). Otherwise a linear transform is built from
+    image_bounds_latlng, [(min_lat, min_lng), (max_lat, max_lng)], and the
+    (height, width) of the processed image.
     """
+    if transform is None:
+        (min_lat, min_lng), (max_lat, max_lng) = image_bounds_latlng
+        transform = bounds_transform({"south_west": {"lat": min_lat, "lng": min_lng},
+                                      "north_east": {"lat": max_lat, "lng": max_lng}}, image_dims)
 
-    # Mocking the bounds and image size for the demo
-    # (min_lat, min_lng), (max_lat, max_lng)
-    (min_lat, min_lng) = image_bounds_latlng[0]
-    (max_lat, max_lng) = image_bounds_latlng[1]
-
-    # Assume a 1024x1024 image
-    img_width_pixels = 1024
-    img_height_pixels = 1024
-
-    # Calculate how much lat/lng each pixel represents
-    pixel_width_geo = (max_lng - min_lng) / img_width_pixels
-    pixel_height_geo = (max_lat - min_lat) / img_height_pixels
-
-    def pixel_to_geo(px, py):
-        """Simple linear interpolation"""
-        lng = min_lng + (px * pixel_width_geo)
-        lat = max_lat - (py * pixel_height_geo) # Y is inverted
-        return [lng, lat]
-
-    features = []
-    for item in fused_data:
-        if "bbox_pixels" in item:
-            x1, y1, x2, y2 = item["bbox_pixels"]
-
-            # Get center of the box
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-
-            # Convert center pixel to geo coordinate
-            [lng, lat] = pixel_to_geo(center_x, center_y)
-
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lng, lat] # GeoJSON is [lng, lat]
-                },
-                "properties": {
-                    "type": item.get("type"),
-                    "class": item.get("class"),
-                    "details": str(item)
-                }
-            }
-            features.append(feature)
+    features = _point_features(fused_data, transform, lambda item: {
+        "type": item.get("type"),
+        "class": item.get("class"),
+        "details": str(item)
+    })
 
     return {
         "type": "FeatureCollection",
@@ -0,0 +1,138 @@
+"""
+Decoded Image Cache
+Process-wide, byte-budgeted LRU cache of decoded images shared by every
+pipeline stage and every request.
+
+Entries are keyed by (real path, mtime, size, mode), so a file that is
+rewritten in place (e.g. an upload to a fixed path) is decoded afresh and
+its stale entries are dropped. Cached arrays are returned read-only;
+callers that need to modify pixels must copy first.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from src import config
+from src.utils.metrics import span
+
+# Modes served by the cache and how each derives from the decoded BGR image
+MODES = ("bgr", "gray", "rgb")
+
+
+class ImageCache:
+    """
+    LRU cache of decoded images bounded by total array bytes.
+
+    Concurrent requests for the same missing image wait for a single
+    decode instead of each decoding it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> ndarray
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> threading.Event
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path: str, mode: str):
+        real = os.path.realpath(path)
+        st = os.stat(real)
+        return (real, st.st_mtime_ns, st.st_size, mode)
+
+    def get(self, path: str, mode: str = "bgr") -> np.ndarray:
+        """
+        Returns the decoded image at `path` as a read-only array.
+
+        Args:
+            path (str): Image file path.
+            mode (str): "bgr" (cv2.imread default), "gray" (BGR2GRAY of
+                        the BGR image) or "rgb".
+
+        Raises:
+            FileNotFoundError: If the file is missing or cannot be decoded.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        try:
+            key = self._key(path, mode)
+        except OSError:
+            raise FileNotFoundError(f"Image not found: {path}")
+
+        while True:
+            with self._lock:
+                image = self._entries.get(key)
+                if image is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return image
+                pending = self._loading.get(key)
+                if pending is None:
+                    pending = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is decoding this image; wait and re-check
+            pending.wait()
+
+        try:
+            image = self._decode(path, mode)
+            self._insert(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.set()
+
+    def _decode(self, path: str, mode: str) -> np.ndarray:
+        if mode == "bgr":
+            with span("decode"):
+                image = cv2.imread(path)
+            if image is None:
+                raise FileNotFoundError(f"Could not decode image: {path}")
+        else:
+            # Derived views come from the cached BGR decode, not a re-read
+            bgr = self.get(path, "bgr")
+            code = cv2.COLOR_BGR2GRAY if mode == "gray" else cv2.COLOR_BGR2RGB
+            with span("decode"):
+                image = cv2.cvtColor(bgr, code)
+        image.setflags(write=False)
+        return image
+
+    def _insert(self, key, image: np.ndarray):
+        if image.nbytes > self.max_bytes:
+            return  # Too large to cache; the caller still gets it
+        with self._lock:
+            # Drop entries for older versions of the same file
+            stale = [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]
+            for k in stale:
+                self._bytes -= self._entries.pop(k).nbytes
+            if key not in self._entries:
+                self._entries[key] = image
+                self._bytes += image.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+default_cache = ImageCache(config.IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def load_image(path: str, mode: str = "bgr") -> np.ndarray:
+    """Decoded, read-only image from the process-wide cache."""
+    return default_cache.get(path, mode)
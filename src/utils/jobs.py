@@ -0,0 +1,205 @@
+"""
+Background Job Queue
+Runs CPU-bound pipeline work on a bounded pool of worker threads so the
+API's event loop only accepts requests and reports status.
+
+The queue holds at most max_queue jobs waiting for a worker; submitting
+beyond that raises QueueFull, which the API turns into a 429 so load is
+shed at the door instead of piling up. Finished jobs are kept for
+result_ttl_s seconds (and at most max_retained of them) for polling.
+
+Cancellation is cooperative: a cancelled job that has not started is
+skipped, and a running job stops at its next StageChannel.emit.
+"""
+
+import asyncio
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from src.utils.metrics import bind
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at its maximum depth."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work function to stop a cancelled job."""
+
+
+class Job:
+    """One submitted unit of work and its outcome."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = Future()
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, CANCELLED)
+
+    def cancel(self):
+        """Requests cancellation; see the module docstring."""
+        self.cancel_event.set()
+
+    async def wait(self):
+        """Awaits the job's result, raising its exception if it failed."""
+        return await asyncio.wrap_future(self.future)
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        info = {"job_id": self.id, "kind": self.kind, "status": self.status,
+                "created_at": self.created_at, "started_at": self.started_at,
+                "finished_at": self.finished_at}
+        if self.status == SUCCEEDED and include_result:
+            info["result"] = self.result
+        if self.status == FAILED:
+            info["error"] = self.error
+        return info
+
+
+class JobQueue:
+    """
+    Bounded worker pool with a bounded wait queue.
+
+    Args:
+        workers (int): Jobs run concurrently.
+        max_queue (int): Jobs allowed to wait for a worker.
+        result_ttl_s (float): How long finished jobs stay queryable.
+        max_retained (int): Upper bound on jobs kept in memory.
+    """
+
+    def __init__(self, workers: int, max_queue: int, result_ttl_s: float = 3600.0,
+                 max_retained: int = 1000):
+        self.workers = max(workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self.result_ttl_s = result_ttl_s
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()  # job_id -> Job, oldest first
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> Job:
+        """
+        Queues fn(*args, **kwargs).
+
+        Raises:
+            QueueFull: If max_queue jobs are already waiting.
+        """
+        job = Job(kind)
+        with self._lock:
+            # Idle workers pick a job up immediately, so only the excess waits
+            if self._queued + self._running >= self.workers + self.max_queue:
+                raise QueueFull(f"Job queue is full ({self.max_queue} waiting).")
+            self._queued += 1
+            self._prune()
+            self._jobs[job.id] = job
+        # Stage spans of the job count towards the request that submitted it
+        self._executor.submit(self._run, job, bind(fn), args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "running": self._running, "queued": self._queued,
+                    "max_queue": self.max_queue, "retained": len(self._jobs)}
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        job.status, job.started_at = RUNNING, time.time()
+        job.future.set_running_or_notify_cancel()
+        try:
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            result = fn(*args, **kwargs)
+        except JobCancelled as e:
+            print(f"[Jobs] {job.kind} job {job.id} cancelled.")
+            job.status, job.finished_at = CANCELLED, time.time()
+            job.future.set_exception(e)
+        except Exception as e:
+            print(f"[Jobs] {job.kind} job {job.id} failed: {e}")
+            traceback.print_exc()
+            job.error = str(e) or type(e).__name__
+            job.status, job.finished_at = FAILED, time.time()
+            job.future.set_exception(e)
+        else:
+            job.result = result
+            job.status, job.finished_at = SUCCEEDED, time.time()
+            job.future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _prune(self):
+        """Drops expired finished jobs, then the oldest finished ones over max_retained."""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.done and now - job.finished_at > self.result_ttl_s]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if len(self._jobs) >= self.max_retained:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.done]:
+                del self._jobs[job_id]
+                if len(self._jobs) < self.max_retained:
+                    break
+
+
+class StageChannel:
+    """
+    Carries a job's intermediate stage results from its worker thread to
+    an asyncio consumer (e.g. a streaming response) as they are produced.
+
+    The work function calls emit(stage, payload) at each stage boundary;
+    emit raises JobCancelled once the job has been cancelled, so the
+    remaining stages are never run.
+    """
+
+    _END = object()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self.job = None
+
+    def attach(self, job: Job):
+        """Binds the channel to its job; the job's completion ends the stream."""
+        self.job = job
+        job.future.add_done_callback(lambda _: self._put(self._END))
+
+    def _put(self, item):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def emit(self, stage: str, payload: dict):
+        """Publishes one stage's output (called from the worker thread)."""
+        if self.job is not None and self.job.cancel_event.is_set():
+            raise JobCancelled()
+        self._put((stage, payload))
+
+    async def stages(self):
+        """Yields (stage, payload) pairs until the job finishes."""
+        while True:
+            item = await self._queue.get()
+            if item is self._END:
+                return
+            yield item
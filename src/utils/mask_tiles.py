@@ -0,0 +1,226 @@
+"""
+Change-Mask Map Tiles
+Serves change masks as XYZ (Web Mercator, 256 px) map tiles rendered on
+demand, so the map only fetches the tiles in view at the resolution it
+needs instead of one full-resolution PNG per analysis.
+
+Each registered mask keeps a max-pooled pyramid (every level halves the
+resolution and a coarse pixel is set if any pixel under it changed, so
+small changes stay visible when zoomed out). Pyramids are bounded by a
+byte budget and rendered tiles by an LRU of max_tiles entries.
+
+Levels are pooled from the registered mask in row strips, so a
+disk-backed mask (e.g. from streaming change detection) is never copied
+whole. A mask whose pyramid would exceed the whole budget starts at the
+finest level that fits; its tiles and footprint are then that coarse.
+
+Masks are placed on the map with the same linear lat/lng mapping as
+convert_pixels_to_geojson: row 0 is the northern edge of the bounds.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from src import config
+
+TILE_SIZE = 256
+MAX_ZOOM = 24
+# Changed pixels are drawn in this BGRA colour; the rest is transparent.
+CHANGE_COLOUR = (0, 0, 255, 160)
+# Source bytes read per strip while pooling or hashing a mask.
+STRIP_BYTES = 16 * 1024 * 1024
+
+
+def _strip_rows(row_bytes: int, multiple: int = 1) -> int:
+    """Rows per strip of an array with row_bytes per row, rounded down to a multiple."""
+    return max(multiple, STRIP_BYTES // max(row_bytes, 1) // multiple * multiple)
+
+
+def _level_shapes(shape, min_size: int) -> list:
+    """Shape of every pyramid level, full resolution first."""
+    shapes = [tuple(shape)]
+    while max(shapes[-1]) > min_size:
+        h, w = shapes[-1]
+        shapes.append((-(-h // 2), -(-w // 2)))
+    return shapes
+
+
+def _pool(src: np.ndarray, factor: int) -> np.ndarray:
+    """0/1 uint8 max pool of src (any non-zero pixel is changed) by factor, strip by strip."""
+    h, w = src.shape
+    out = np.empty((-(-h // factor), -(-w // factor)), dtype=np.uint8)
+    step = _strip_rows(w * src.itemsize, factor)
+    for row in range(0, h, step):
+        strip = np.asarray(src[row:row + step]) > 0
+        # Pad to a multiple of factor so the pooling covers every pixel
+        padded = np.pad(strip, ((0, -strip.shape[0] % factor), (0, -w % factor)))
+        pooled = padded.reshape(padded.shape[0] // factor, factor,
+                                padded.shape[1] // factor, factor).max(axis=(1, 3))
+        out[row // factor:row // factor + pooled.shape[0]] = pooled
+    return out
+
+
+def build_pyramid(mask: np.ndarray, max_bytes: int = None, min_size: int = TILE_SIZE) -> list:
+    """
+    Max-pooled 0/1 pyramid of a mask, finest level first.
+
+    With max_bytes, levels finer than the first whose pyramid fits in
+    max_bytes are skipped; that level is pooled straight from the mask.
+    """
+    shapes = _level_shapes(mask.shape[:2], min_size)
+    first = 0
+    if max_bytes is not None:
+        while first < len(shapes) - 1 and sum(h * w for h, w in shapes[first:]) > max_bytes:
+            first += 1
+    levels = [_pool(mask, 2 ** first)]
+    while max(levels[-1].shape) > min_size:
+        levels.append(_pool(levels[-1], 2))
+    return levels
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """(west, south, east, north) of an XYZ tile in degrees."""
+    n = 2 ** z
+    west, east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def _row_latitudes(z: int, y: int) -> np.ndarray:
+    """Latitude of the centre of each pixel row of a tile (Mercator is non-linear)."""
+    n = 2 ** z
+    merc_y = (y + (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE) / n
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * merc_y))))
+
+
+def _encode(tile: np.ndarray) -> bytes:
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    rgba[tile > 0] = CHANGE_COLOUR
+    return cv2.imencode(".png", rgba)[1].tobytes()
+
+
+EMPTY_TILE = _encode(np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8))
+
+
+class MaskTileServer:
+    def __init__(self, max_bytes: int, max_tiles: int):
+        self.max_bytes = max_bytes
+        self.max_tiles = max_tiles
+        self._masks = OrderedDict()  # analysis_id -> (pyramid, bounds)
+        self._bytes = 0
+        self._tiles = OrderedDict()  # (analysis_id, z, x, y) -> png bytes
+        self._lock = threading.Lock()
+
+    def register(self, mask: np.ndarray, bounds: dict) -> str:
+        """
+        Stores a mask covering bounds and returns its analysis ID.
+
+        The ID is derived from the mask bytes and bounds, so registering
+        the same result twice reuses one pyramid.
+        """
+        # Hashed strip by strip: same digest as the whole buffer, no full copy
+        digest = hashlib.sha256()
+        step = _strip_rows(mask.shape[1] * mask.itemsize)
+        for row in range(0, mask.shape[0], step):
+            digest.update(np.ascontiguousarray(mask[row:row + step]))
+        digest.update(json.dumps([mask.shape, bounds], sort_keys=True).encode())
+        analysis_id = digest.hexdigest()[:32]
+        with self._lock:
+            if analysis_id in self._masks:
+                self._masks.move_to_end(analysis_id)
+                return analysis_id
+
+        pyramid = build_pyramid(mask, self.max_bytes)
+        size = sum(level.nbytes for level in pyramid)
+        with self._lock:
+            if analysis_id not in self._masks:
+                self._masks[analysis_id] = (pyramid, bounds)
+                self._bytes += size
+                # Never evict the mask just stored, even if it alone exceeds the budget
+                while self._bytes > self.max_bytes and len(self._masks) > 1:
+                    evicted, (old, _) = self._masks.popitem(last=False)
+                    self._bytes -= sum(level.nbytes for level in old)
+                    for key in [k for k in self._tiles if k[0] == evicted]:
+                        del self._tiles[key]
+        return analysis_id
+
+    def fits(self, shape) -> bool:
+        """Whether the full-resolution pyramid of a mask of shape fits the byte budget."""
+        return sum(h * w for h, w in _level_shapes(shape[:2], TILE_SIZE)) <= self.max_bytes
+
+    def mask(self, analysis_id: str):
+        """
+        (0/1 mask, bounds) of an analysis, or None if unknown or evicted.
+
+        The mask is the finest pyramid level kept, so it is coarser than
+        the registered mask when that exceeded the budget.
+        """
+        with self._lock:
+            entry = self._masks.get(analysis_id)
+            if entry is None:
+                return None
+            self._masks.move_to_end(analysis_id)
+            return entry[0][0], entry[1]
+
+    def tile(self, analysis_id: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """PNG bytes of one tile, or None if the analysis is unknown or evicted."""
+        key = (analysis_id, z, x, y)
+        with self._lock:
+            png = self._tiles.get(key)
+            if png is not None:
+                self._tiles.move_to_end(key)
+                return png
+            entry = self._masks.get(analysis_id)
+            if entry is None:
+                return None
+            self._masks.move_to_end(analysis_id)
+
+        png = self._render(*entry, z, x, y)
+        with self._lock:
+            self._tiles[key] = png
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return png
+
+    @staticmethod
+    def _render(pyramid: list, bounds: dict, z: int, x: int, y: int) -> bytes:
+        west, south, east, north = tile_bounds(z, x, y)
+        min_lng, max_lng = bounds["south_west"]["lng"], bounds["north_east"]["lng"]
+        min_lat, max_lat = bounds["south_west"]["lat"], bounds["north_east"]["lat"]
+        if east <= min_lng or west >= max_lng or north <= min_lat or south >= max_lat:
+            return EMPTY_TILE
+
+        # Coarsest level that still has at least one mask pixel per tile pixel
+        full_h, full_w = pyramid[0].shape
+        mask_px_per_tile_px = ((east - west) / TILE_SIZE) / ((max_lng - min_lng) / full_w)
+        level = int(np.clip(math.floor(math.log2(max(mask_px_per_tile_px, 1.0))), 0, len(pyramid) - 1))
+        src = pyramid[level]
+        h, w = src.shape
+
+        # Sample the level at each tile pixel centre (nearest neighbour)
+        lngs = west + (np.arange(TILE_SIZE) + 0.5) * (east - west) / TILE_SIZE
+        cols = np.floor((lngs - min_lng) / (max_lng - min_lng) * w).astype(np.int64)
+        rows = np.floor((max_lat - _row_latitudes(z, y)) / (max_lat - min_lat) * h).astype(np.int64)
+        valid_cols, valid_rows = (cols >= 0) & (cols < w), (rows >= 0) & (rows < h)
+        if not valid_cols.any() or not valid_rows.any():
+            return EMPTY_TILE
+
+        tile = src[np.clip(rows, 0, h - 1)[:, None], np.clip(cols, 0, w - 1)[None, :]]
+        tile &= (valid_rows[:, None] & valid_cols[None, :]).astype(np.uint8)
+        return _encode(tile) if tile.any() else EMPTY_TILE
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"masks": len(self._masks), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "tiles": len(self._tiles), "max_tiles": self.max_tiles}
+
+
+default_tiles = MaskTileServer(config.TILE_PYRAMID_MAX_MB * 1024 * 1024, config.TILE_CACHE_MAX_TILES)
@@ -0,0 +1,222 @@
+"""
+Pipeline Metrics
+Timing spans around each pipeline stage (decode, ssim, morphology,
+contours, inference, fusion, geojson, report), aggregated into
+Prometheus histograms served on /metrics and collected per request for
+a Server-Timing response header.
+
+Each span also records how much the process' peak RSS grew while it
+ran and, with METRICS_TRACE_ALLOCATIONS, the net bytes allocated
+(tracemalloc; NumPy arrays are traced too). Both are process-wide, so
+stages running concurrently share the blame for each other's growth.
+
+Spans on worker threads reach the request that started them through
+contextvars; code that fans work out to its own threads wraps the work
+in bind(). Stages that run per tile record one span per tile, and their
+Server-Timing entry is the sum, which can exceed wall-clock time.
+
+With METRICS_ENABLED off, timed() returns functions unchanged and span()
+a shared no-op context manager, so instrumentation costs nothing.
+"""
+
+import contextvars
+import functools
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src import config
+
+STAGES = ("decode", "ssim", "morphology", "contours", "inference", "fusion", "geojson", "report")
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(float(2 ** 20 * n) for n in (0, 1, 4, 16, 64, 256, 1024, 4096))
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+_NOOP = nullcontext()
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+if config.METRICS_ENABLED and config.METRICS_TRACE_ALLOCATIONS:
+    tracemalloc.start()
+
+
+def _peak_rss() -> int:
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label-value tuple."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...],
+                 labels: Tuple[str, ...] = ("stage",)):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.labels = labels
+        self._series = {}  # label values -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, counts in series:
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{_format_value(bound)}"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {counts[-1]!r}")
+            lines.append(f"{self.name}_count{{{labels}}} {counts[-2]}")
+        return lines
+
+
+stage_duration = Histogram("drishti_stage_duration_seconds",
+                           "Wall-clock time of one pipeline stage span.", DURATION_BUCKETS)
+stage_rss_growth = Histogram("drishti_stage_peak_rss_growth_bytes",
+                             "Growth of the process' peak RSS during one stage span.", BYTES_BUCKETS)
+stage_allocated = Histogram("drishti_stage_allocated_bytes",
+                            "Net bytes allocated (tracemalloc) during one stage span.", BYTES_BUCKETS)
+request_duration = Histogram("drishti_http_request_duration_seconds",
+                             "Time to produce an HTTP response (headers), by route.", DURATION_BUCKETS,
+                             labels=("method", "route", "status"))
+
+
+class _Span:
+    __slots__ = ("stage", "start", "rss", "allocated")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.rss = _peak_rss()
+        self.allocated = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        key = (self.stage,)
+        stage_duration.observe(key, elapsed)
+        stage_rss_growth.observe(key, _peak_rss() - self.rss)
+        if self.allocated is not None and tracemalloc.is_tracing():
+            stage_allocated.observe(key, max(tracemalloc.get_traced_memory()[0] - self.allocated, 0))
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def span(stage: str):
+    """Context manager timing one run of a pipeline stage."""
+    return _Span(stage) if config.METRICS_ENABLED else _NOOP
+
+
+def timed(stage: str) -> Callable:
+    """Decorator recording every call of a function as a span of stage."""
+    def decorate(fn):
+        if not config.METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def bind(fn: Callable) -> Callable:
+    """fn wrapped to run in a copy of the caller's context, for use on other threads."""
+    if not config.METRICS_ENABLED:
+        return fn
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def collect():
+    """Collects (stage, seconds) of every span in this context, incl. bound threads."""
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings: List[Tuple[str, float]], total_s: Optional[float] = None) -> str:
+    """Server-Timing header value: summed milliseconds per stage, in pipeline order."""
+    totals: Dict[str, float] = {}
+    for stage, seconds in list(timings):
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    entries = [f"{stage};dur={seconds * 1000:.1f}"
+               for stage, seconds in sorted(totals.items(), key=lambda kv: order.get(kv[0], len(order)))]
+    if total_s is not None:
+        entries.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(entries)
+
+
+async def server_timing_middleware(request, call_next):
+    """
+    HTTP middleware recording request latency by route and adding a
+    Server-Timing header with the stage spans the request caused.
+
+    Streaming responses send their headers before the pipeline has run,
+    so their header only covers the time to the first byte.
+    """
+    if not config.METRICS_ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    with collect() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    request_duration.observe((request.method, route, str(response.status_code)), elapsed)
+    response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for histogram in (stage_duration, stage_rss_growth, stage_allocated, request_duration):
+        lines.extend(histogram.render())
+    lines += ["# HELP drishti_process_peak_rss_bytes Peak resident set size of the process.",
+              "# TYPE drishti_process_peak_rss_bytes gauge",
+              f"drishti_process_peak_rss_bytes {_peak_rss()}"]
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
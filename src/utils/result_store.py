@@ -0,0 +1,55 @@
+"""
+Content-Addressed Result Store
+In-memory, byte-budgeted store for per-request outputs (change masks,
+reports) so the API never writes them to shared paths on disk.
+
+Each blob is addressed by the SHA-256 of its bytes: identical outputs
+share one entry, a digest always names the same content (so responses can
+be cached forever), and concurrent requests cannot overwrite each other.
+Least recently used blobs are evicted once max_bytes is exceeded.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from src import config
+
+
+class ResultStore:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._blobs = OrderedDict()  # digest -> (bytes, media_type)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, media_type: str = "application/octet-stream") -> str:
+        """Stores data and returns its hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._blobs:
+                self._blobs.move_to_end(digest)
+                return digest
+            self._blobs[digest] = (data, media_type)
+            self._bytes += len(data)
+            # Never evict the blob just stored, even if it alone exceeds the budget
+            while self._bytes > self.max_bytes and len(self._blobs) > 1:
+                _, (evicted, _) = self._blobs.popitem(last=False)
+                self._bytes -= len(evicted)
+        return digest
+
+    def get(self, digest: str) -> Optional[Tuple[bytes, str]]:
+        """Returns (data, media_type), or None if unknown or evicted."""
+        with self._lock:
+            entry = self._blobs.get(digest)
+            if entry is not None:
+                self._blobs.move_to_end(digest)
+            return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._blobs), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+default_store = ResultStore(config.RESULT_STORE_MAX_MB * 1024 * 1024)